@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" reproducible benchmark suite for pyparsing_regex
+
+Every grammar is measured phase by phase (compile, raw regex match, result shaping) as well as end to end for
+``parseString``, ``scanString``, ``searchString``, ``searchColumns`` and ``transformString``,
+next to the same grammar in pyparsing (if installed). So is the import time of the packages (in fresh interpreters).
+Results are written as json, and can be compared against an earlier run to catch regressions::
+
+    python benchmark/benchmark.py --output bench.json
+    python benchmark/benchmark.py --compare bench.json --tolerance 1.2
+"""
+from __future__ import print_function, division
+__author__ = 'Stephan Sahm <Stephan.Sahm@gmx.de>'
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from timeit import default_timer
+
+import pyparsing_regex as pr
+from pyparsing_regex import _core, _helpers_regex as hre
+
+try:
+    import pyparsing as pp
+except ImportError:
+    pp = None
+
+
+# grammars
+# ========
+# every entry: name -> (pyparsing_regex builder, pyparsing builder, parse input, search input)
+# both libraries skip whitespace the same way, the default inputs just do not contain any.
+# On sparse inputs (LogGrep), scanString vs regex_finditer shows the gain of the scan prefilter
+
+def _search_input(record, noise="-_-_-_-_-_", n=2000):
+    return (noise + record) * n
+
+LOG_NOISE = "".join("2016-03-01 12:00:%02d INFO user %d logged in from 10.0.0.%d\n" % (i, i, i) for i in range(20))
+
+#: name -> (noise, n) for grammars not searched in the default input
+SEARCH_INPUTS = {
+    # sparse matches, like grepping records out of a big log
+    "LogGrep": (LOG_NOISE, 200),
+}
+
+def _word(m):
+    return m.Word("abc", exact=2)("w")
+
+def _repeat_group(m):
+    w = m.Word("abc", exact=2)
+    if m is pr:
+        ww = m.GroupLiftKeys(w("a") + w("b"))("ww")
+        return m.Repeat(ww, 2, 4)
+    ww = m.Group(w("a") + w("b"))("ww")
+    return ww * (2, 4)
+
+def _group(m):
+    return m.Group(m.Word("0123456789")("n") + m.Literal(",") + m.Word("0123456789")("m"))("g")
+
+def _skipto(m):
+    return m.Literal("<") + m.SkipTo(m.Literal(">"))("inner") + m.Literal(">")
+
+def _matchfirst(m):
+    return m.MatchFirst([m.Literal(k) for k in ("foo", "bar", "baz", "qux")])("kw")
+
+KEYWORDS = ["%s%d" % (prefix, i) for i in range(2500) for prefix in ("key", "kw", "if", "x")] # 10k keywords
+
+def _keywords(m):
+    if m is pr:
+        return m.MatchFirst([m.Literal(k) for k in KEYWORDS])("kw") # compiled into a single prefix trie
+    # what oneOf generates, without its quadratic overlap check (which alone takes seconds for 10k keywords)
+    return m.Regex("|".join(hre.regex.escape(k) for k in sorted(KEYWORDS, key=len, reverse=True)))("kw")
+
+def _optional(m):
+    return m.Word("0123456789")("int") + m.Optional(m.Literal(".") + m.Word("0123456789")("frac"))
+
+def _loggrep(m):
+    return m.Literal("ERROR") + m.Literal("code=") + m.Word("0123456789")("code")
+
+GRAMMARS = [
+    ("Word", _word, "ab"),
+    ("Repeat+GroupLiftKeys", _repeat_group, "abcbbcccabccbcca"),
+    ("Group", _group, "123,456"),
+    ("SkipTo", _skipto, "<some skipped text>"),
+    ("MatchFirst", _matchfirst, "baz"),
+    ("Optional", _optional, "3.1415"),
+    ("Keywords10k", _keywords, "x2499"),
+    ("LogGrep", _loggrep, "ERROR code=4711"),
+]
+
+
+# measurement
+# ===========
+
+def best_of(func, number, repeat):
+    """ best time per call in seconds """
+    best = float("inf")
+    for _ in range(repeat):
+        start = default_timer()
+        for _ in range(number):
+            func()
+        best = min(best, (default_timer() - start) / number)
+    return best
+
+
+def bench_pyparsing_regex(name, build, text, number, repeat):
+    search_text = _search_input(text, *SEARCH_INPUTS.get(name, ()))
+    results = {}
+
+    def compile_():
+        hre.pattern_cache.clear()
+        build(pr).compile()
+    results["compile"] = best_of(compile_, max(number // 100, 1), repeat)
+
+    elem = build(pr)
+    compiled = elem.compile()
+    match = compiled.match(text)
+    assert match is not None, "%s does not match %r" % (name, text)
+    results["match"] = best_of(lambda: compiled.match(text), number, repeat)
+    results["shape"] = best_of(lambda: elem._parseMatch(match), number, repeat)
+    results["shape_lazy"] = best_of(lambda: elem._parseMatch(match, lazy=True)[0], number, repeat)
+    results["shape_compact"] = best_of(lambda: elem._parseMatch(match, lazy="compact")[0], number, repeat)
+
+    results["parseString"] = best_of(lambda: elem.parseString(text), number, repeat)
+    results["scanString"] = best_of(lambda: list(elem.scanString(search_text)), 1, repeat)
+    results["searchString"] = best_of(lambda: elem.searchString(search_text), 1, repeat)
+    results["searchColumns"] = best_of(lambda: elem.searchColumns(search_text), 1, repeat)
+    results["transformString"] = best_of(lambda: elem.transformString(search_text), 1, repeat)
+    results["regex_sub"] = best_of(lambda: compiled.sub("", search_text), 1, repeat)
+    results["regex_finditer"] = best_of(lambda: list(compiled.finditer(search_text)), 1, repeat)
+    return results
+
+
+def bench_naive_alternation(name, text, number, repeat):
+    """ the plain alternation with one group per keyword, as Keywords10k was compiled without the trie
+
+    measured on the regex alone, as the nested result Structure of 10k alternatives is too deep to be shaped
+    """
+    search_text = _search_input(text, *SEARCH_INPUTS.get(name, ()))
+    pattern = hre.silent_group("|".join(hre.group(hre.regex.escape(k)) for k in KEYWORDS))
+    results = {}
+
+    def compile_():
+        hre.regex.purge()
+        hre.regex.compile(pattern)
+    results["compile"] = best_of(compile_, 1, repeat)
+    compiled = hre.regex.compile(pattern)
+    assert compiled.match(text) is not None, "%s does not match %r" % (name, text)
+    results["match"] = best_of(lambda: compiled.match(text), number, repeat)
+    results["regex_finditer"] = best_of(lambda: list(compiled.finditer(search_text)), 1, repeat)
+    return results
+
+
+def bench_pyparsing(name, build, text, number, repeat):
+    search_text = _search_input(text, *SEARCH_INPUTS.get(name, ()))
+    results = {}
+    results["compile"] = best_of(lambda: build(pp).streamline(), max(number // 100, 1), repeat)
+    elem = build(pp)
+    results["parseString"] = best_of(lambda: elem.parseString(text), number, repeat)
+    results["scanString"] = best_of(lambda: list(elem.scanString(search_text)), 1, repeat)
+    results["searchString"] = best_of(lambda: elem.searchString(search_text), 1, repeat)
+    results["transformString"] = best_of(lambda: elem.transformString(search_text), 1, repeat)
+    return results
+
+
+def bench_import(repeat):
+    """ time of importing each library in a fresh interpreter, the interpreter start-up itself subtracted
+
+    (imports are only done once per process, so this is measured by subprocesses)
+    """
+    def fresh(statement):
+        start = default_timer()
+        subprocess.check_call([sys.executable, "-c", statement])
+        return default_timer() - start
+
+    repeat = max(repeat, 5) # start-up times are noisy
+    startup = min(fresh("pass") for _ in range(repeat))
+    libraries = [("pyparsing_regex", "import pyparsing_regex")]
+    if pp is not None:
+        libraries.append(("pyparsing", "import pyparsing"))
+    return [dict(grammar="(import)", library=library, phase="import",
+                 seconds=max(min(fresh(statement) for _ in range(repeat)) - startup, 0))
+            for library, statement in libraries]
+
+
+def run(number, repeat, only=None):
+    rows = []
+    if not only or "(import)" in only:
+        rows.extend(bench_import(repeat))
+    for name, build, text in GRAMMARS:
+        if only and name not in only:
+            continue
+        libraries = [("pyparsing_regex", bench_pyparsing_regex)]
+        if pp is not None:
+            libraries.append(("pyparsing", bench_pyparsing))
+        for library, bench in libraries:
+            for phase, seconds in sorted(bench(name, build, text, number, repeat).items()):
+                rows.append(dict(grammar=name, library=library, phase=phase, seconds=seconds))
+        if build is _keywords:
+            for phase, seconds in sorted(bench_naive_alternation(name, text, number, repeat).items()):
+                rows.append(dict(grammar=name, library="regex-naive", phase=phase, seconds=seconds))
+    return rows
+
+
+def metadata():
+    return dict(
+        time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        python=sys.version.split()[0],
+        implementation=platform.python_implementation(),
+        platform=platform.platform(),
+        pyparsing=getattr(pp, "__version__", None),
+        shaping="python" if _core._shaping is _core else "cython",
+    )
+
+
+# reporting
+# =========
+
+def print_table(rows):
+    print("%-22s %-16s %-16s %14s" % ("grammar", "library", "phase", "usec/call"))
+    for row in rows:
+        print("%-22s %-16s %-16s %14.2f" % (row["grammar"], row["library"], row["phase"], row["seconds"] * 1e6))
+
+
+def compare(rows, baseline_rows, tolerance):
+    """ prints ratios to baseline, returns number of regressions beyond ``tolerance`` """
+    key = lambda row: (row["grammar"], row["library"], row["phase"])
+    baseline = dict((key(row), row["seconds"]) for row in baseline_rows)
+    regressions = 0
+    for row in rows:
+        if key(row) not in baseline:
+            continue
+        ratio = row["seconds"] / baseline[key(row)]
+        flag = ""
+        if ratio > tolerance and row["library"] == "pyparsing_regex":
+            flag = "  REGRESSION"
+            regressions += 1
+        print("%-22s %-16s %-16s %8.2fx%s" % (key(row) + (ratio, flag)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=1000, help="calls per timing for single string parsing")
+    parser.add_argument("--repeat", type=int, default=3, help="timings per measurement, the best one is kept")
+    parser.add_argument("--only", nargs="*", help="grammar names to run, (import) for the import time")
+    parser.add_argument("--output", help="json file to store results")
+    parser.add_argument("--compare", help="json file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown ratio in --compare")
+    args = parser.parse_args(argv)
+
+    rows = run(args.number, args.repeat, args.only)
+    print_table(rows)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(meta=metadata(), results=rows), f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(rows, baseline["results"], args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
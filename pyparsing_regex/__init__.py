@@ -20,11 +20,15 @@ For further documentation, see also  http://pyparsing.wikispaces.com/
 
 This lives on github https://github.com/schlichtanders/pyparsing_regex
 """
+__version__ = '0.1.0'
+
 from ._interface import *
 __all__ = [
     'Literal', 'Regex', 'Word', 'CharsNotIn', 'SkipTo', 'FollowedBy',
     'Combine', 'Suppress', 'StringStart', 'StringEnd', 'LineStart', 'LineEnd',
-    'And', 'MatchFirst', 'Optional', 'Group', 'GroupLiftKeys', 'OneOrMore', 'ZeroOrMore',
+    'And', 'MatchFirst', 'oneOf', 'Optional', 'Group', 'GroupLiftKeys', 'OneOrMore', 'ZeroOrMore',
     'Repeat', 'setResultsNameInPlace',
-    'ParserElement'
+    'ParserElement', 'pattern_cache', 'ParseTimeoutError', 'BacktrackingWarning', 'CarryExceededError',
+    'profiling', 'enableProfiling', 'disableProfiling', 'profileStats', 'resetProfileStats',
+    'cachedGrammar'
 ]
@@ -0,0 +1,131 @@
+""" asyncio side of ParserElement.scanAsync
+
+Kept in an own module so that asyncio (or its Python 2 backport trollius) only gets imported when actually used.
+Everything is written with futures and callbacks instead of ``async``/``await`` syntax,
+so this module stays importable by every Python the package supports.
+"""
+import codecs
+from collections import deque
+from functools import partial
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from pyparsing_regex._core import StreamScanner
+
+try:
+    _StopAsyncIteration = StopAsyncIteration
+except NameError: # no asynchronous iterators before Python 3.5
+    class _StopAsyncIteration(Exception):
+        pass
+
+
+class AsyncScanner(object):
+    """ scans an asyncio stream incrementally, results are available as soon as they are completed
+
+    ``source`` is an ``asyncio.StreamReader`` (anything with a coroutine ``read(n)``)
+    or an asynchronous iterator of chunks (Python 3.5+).
+
+    Use ``async for tokens, start, end in scanner`` or, also without async syntax,
+    ``yield From(scanner.get())`` / ``loop.run_until_complete(scanner.get())`` until None is returned.
+
+    Scanning a buffer of at least ``offload`` characters is run by ``loop.run_in_executor(executor, ...)``,
+    so that long regex runs do not block the event loop.
+    Byte chunks are decoded with ``encoding`` if given.
+    """
+
+    def __init__(self, element, source, chunk_size, maxMatches, maxCarry=None,
+                 offload=None, executor=None, encoding=None, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.scanner = StreamScanner(element, maxCarry)
+        if hasattr(source, 'read'):
+            self._next_chunk = partial(source.read, chunk_size)
+        else:
+            self._next_chunk = source.__aiter__().__anext__
+        self.offload = offload
+        self.executor = executor
+        self._decoder = codecs.getincrementaldecoder(encoding)() if encoding else None
+        self._ready = deque()
+        self._remaining = maxMatches
+        self._closed = False
+        self._waiting = deque() # futures handed out by get, in order
+
+    def get(self):
+        """ future of the next ``(tokens, start, end)``, or of None if the stream is exhausted """
+        future = asyncio.Future(loop=self.loop)
+        self._waiting.append(future)
+        if len(self._waiting) == 1: # otherwise a read is already going on
+            self._serve()
+        return future
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = asyncio.Future(loop=self.loop)
+        def forward(result):
+            if result.exception() is not None:
+                future.set_exception(result.exception())
+            elif result.result() is None:
+                future.set_exception(_StopAsyncIteration())
+            else:
+                future.set_result(result.result())
+        self.get().add_done_callback(forward)
+        return future
+
+    def _serve(self):
+        """ resolves waiting futures by ready results, reads the next chunk if more are needed """
+        while self._waiting:
+            if self._remaining <= 0 or self._closed and not self._ready:
+                self._waiting.popleft().set_result(None)
+            elif self._ready:
+                self._remaining -= 1
+                self._waiting.popleft().set_result(self._ready.popleft())
+            else:
+                read = asyncio.ensure_future(self._next_chunk(), loop=self.loop)
+                read.add_done_callback(self._on_chunk)
+                return
+
+    def _fail(self, exception):
+        while self._waiting:
+            self._waiting.popleft().set_exception(exception)
+
+    def _on_chunk(self, read):
+        try:
+            chunk = read.result()
+        except _StopAsyncIteration:
+            chunk = b''
+        except Exception as e:
+            self._fail(e)
+            return
+        final = not chunk
+        if self._decoder is not None:
+            chunk = self._decoder.decode(chunk, final)
+
+        if self.offload is not None and len(self.scanner.buffer) + len(chunk) >= self.offload:
+            work = self.loop.run_in_executor(self.executor, self._scan, chunk, final)
+            work.add_done_callback(self._on_scanned)
+        else:
+            try:
+                self._ready.extend(self._scan(chunk, final))
+            except Exception as e:
+                self._fail(e)
+                return
+            self._serve()
+
+    def _on_scanned(self, work):
+        try:
+            self._ready.extend(work.result())
+        except Exception as e:
+            self._fail(e)
+            return
+        self._serve()
+
+    def _scan(self, chunk, final):
+        results = self.scanner.feed(chunk) if chunk else []
+        if final:
+            results += self.scanner.close()
+            self._closed = True
+        return results
@@ -0,0 +1,166 @@
+""" persistent on-disk cache of compiled grammars
+
+A finished ParserElement is stored together with its pattern and result-shaping plan,
+so that loading it neither reruns the grammar construction code nor build_node / the plan computation / minimize.
+Only ``regex.compile`` itself is repeated (compiled patterns cannot be stored).
+
+Every cache file starts with a small header, which is checked before the (larger) element is unpickled.
+It holds the library version, a hash of the library sources and a key hashing the source of the module defining
+the grammar builder, so that editing the grammar or changing pyparsing_regex invalidates the file automatically.
+
+As unpickling can run arbitrary code, files are only loaded if owned by and writable only by the current user,
+within a directory nobody else may replace them in. The default directory is per user.
+
+hashlib, inspect and tempfile are imported only when needed, as this module is imported by the package itself.
+"""
+import cPickle
+import os
+import stat
+import warnings
+
+import pyparsing_regex._helpers_regex as hre
+
+FORMAT = 3
+
+#: directory of cachedGrammar files, None for "pyparsing_regex" within the user's cache directory
+cache_dir = None
+
+_library_hash = None
+
+
+def _cache_dir():
+    if cache_dir is not None:
+        return cache_dir
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pyparsing_regex")
+
+
+def _header(key):
+    import pyparsing_regex # not at import time, as this module is imported by the package itself
+    return dict(format=FORMAT, version=pyparsing_regex.__version__, library=_library(), key=key)
+
+
+def _library():
+    """ hash of the sources of pyparsing_regex itself (computed once) """
+    global _library_hash
+    if _library_hash is None:
+        import hashlib
+        h = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(directory)):
+            if name.endswith((".py", ".pyx")):
+                with open(os.path.join(directory, name), "rb") as f:
+                    h.update(f.read())
+        _library_hash = h.hexdigest()
+    return _library_hash
+
+
+def _trusted(f):
+    """ whether nobody but the current user can have written the opened cache file ``f`` """
+    if not hasattr(os, 'getuid'): # no ownership checks available (Windows)
+        return True
+    uid = os.getuid()
+    info = os.fstat(f.fileno())
+    if info.st_uid != uid or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    # others must not be able to replace the file, i.e. the directory must be theirs or sticky like /tmp
+    info = os.stat(os.path.dirname(os.path.abspath(f.name)))
+    if info.st_uid not in (uid, 0):
+        return False
+    return not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH) or bool(info.st_mode & stat.S_ISVTX)
+
+
+def grammar_key(builder, key=None):
+    """ hash identifying the definition of the grammar build by ``builder``
+
+    covers the source of the whole module of ``builder`` (falling back to its bytecode),
+    grammar definitions living in other modules need to be reflected by the additional ``key``
+    """
+    import hashlib
+    import inspect
+    import marshal
+    try:
+        source = inspect.getsource(inspect.getmodule(builder))
+    except (TypeError, IOError):
+        source = marshal.dumps(builder.__code__)
+    h = hashlib.sha1(source)
+    h.update(repr(key))
+    return h.hexdigest()
+
+
+def dump(element, filename, key=None):
+    """ stores compiled ``element`` in ``filename`` (written atomically, so concurrent workers are fine) """
+    import tempfile
+    compiled = element._getCompiled() # make sure pattern and plan exist
+    state = element.__getstate__() # the grammar tree without anything rebuild on demand
+    state['_plan'] = element._plan
+    state['_prefilter'] = element._prefilter
+    del state['_compiled']
+    state['_minimizedPattern'] = compiled.pattern
+    header = _header(key)
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    fd, tmpname = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            cPickle.dump(header, f, cPickle.HIGHEST_PROTOCOL)
+            cPickle.dump((element.__class__, state), f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmpname, filename)
+    except:
+        os.remove(tmpname)
+        raise
+
+
+def load(filename, key=None):
+    """ loads element stored by ``dump``, or returns None if there is no valid cache file for ``key`` """
+    try:
+        f = open(filename, "rb")
+    except IOError:
+        return None
+    with f:
+        if not _trusted(f):
+            return None
+        try:
+            header = cPickle.load(f)
+            if header != _header(key):
+                return None
+            cls, state = cPickle.load(f)
+        except Exception: # corrupt or from an incompatible version, will be overwritten
+            return None
+
+    pattern = state.pop('_minimizedPattern')
+    element = cls.__new__(cls)
+    element.__dict__.update(state)
+    element._compiled = hre.pattern_cache.get(pattern)
+    return element
+
+
+def cachedGrammar(builder, filename=None, key=None):
+    """ returns ``builder()`` compiled, loaded from an on-disk cache if still valid
+
+    Parameters
+    ----------
+    builder : callable
+        without arguments, constructs the grammar (only called if the cache is missing or stale).
+        Grammars which cannot be pickled (e.g. with lambda parse actions) are returned without caching,
+        with a RuntimeWarning telling why.
+    filename : str
+        cache file, by default named after ``builder`` within ``cache_dir``
+    key : object with stable repr
+        additionally invalidates the cache when changed, e.g. for grammar parts defined in other modules
+    """
+    if filename is None:
+        filename = os.path.join(_cache_dir(), "%s.%s.grammar" % (builder.__module__, builder.__name__))
+    key = grammar_key(builder, key)
+    element = load(filename, key)
+    if element is None:
+        element = builder()
+        try:
+            dump(element, filename, key)
+        except (cPickle.PicklingError, TypeError, AttributeError, EnvironmentError) as e:
+            # e.g. lambda parse actions cannot be pickled, the grammar is just not cached then
+            warnings.warn("grammar of %s.%s is not cached: %s" % (builder.__module__, builder.__name__, e),
+                          RuntimeWarning, stacklevel=2)
+    return element
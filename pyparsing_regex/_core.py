@@ -1,25 +1,101 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import os
 import regex
 import sys
 import abc
+import mmap
+import warnings
+from collections import namedtuple
+from contextlib import contextmanager
+from array import array
+from copy import copy
 from functools import partial
+from itertools import islice
+from operator import itemgetter
 
 from schlichtanders.myobjects import Count, create_counter, Structure
 import pyparsing_regex._helpers_regex as hre
-from pprint import pformat
+import pyparsing_regex._profile as _profile
 
-import cPickle
 Count = create_counter() # does not work under cython
 
 # Count = create_counter("Count") # this is unfortunately yet not pickable with pyximport
 
-def deepcopy(o):
-    """fast deepcopy alternative"""
-    return cPickle.loads(cPickle.dumps(o, -1))
-
 _MAX_INT = sys.maxint
+_CHUNK_SIZE = 1 << 16
+
+try:
+    _RegexTimeout = TimeoutError
+except NameError: # Python 2 has no TimeoutError, there regex raises a RuntimeError "regex timed out" instead
+    _RegexTimeout = RuntimeError
+
+
+class ParseTimeoutError(RuntimeError):
+    """ matching did not finish within the ``timeout`` given to parseString, scanString or searchString """
+
+
+class BacktrackingWarning(UserWarning):
+    """ the compiled pattern contains constructs which may backtrack catastrophically, see ``hre.risky_constructs`` """
+
+
+class CarryExceededError(RuntimeError):
+    """ a match pending in ``scanStream`` or ``scanAsync`` spans more than the given ``maxCarry`` characters """
+
+
+_timeouts_supported = None # whether the installed regex knows ``timeout``, checked on first use
+
+
+def _check_timeouts():
+    """ raises NotImplementedError if the installed regex is too old to know ``timeout`` """
+    global _timeouts_supported
+    if _timeouts_supported is None:
+        try:
+            regex.compile("").match("", timeout=1)
+            _timeouts_supported = True
+        except TypeError:
+            _timeouts_supported = False
+    if not _timeouts_supported:
+        raise NotImplementedError("timeout needs a regex release supporting it, please upgrade regex")
+
+
+def _timeout_error(timeout):
+    return ParseTimeoutError("matching exceeded the timeout of %s seconds" % timeout)
+
+
+def _timed_out(error):
+    """ whether ``error`` is regex's timeout (on Python 2 other RuntimeErrors, e.g. of the recursion limit, are not) """
+    return _RegexTimeout is not RuntimeError or "timed out" in str(error)
+
+
+def _user_stacklevel():
+    """ ``stacklevel`` for ``warnings.warn`` in the calling function, pointing at the first frame outside the package """
+    frame = sys._getframe(1)
+    level = 1
+    while frame is not None and frame.f_globals.get('__name__', '').startswith('pyparsing_regex.'):
+        frame = frame.f_back
+        level += 1
+    return level
+
+
+@contextmanager
+def _mapped_file(file_or_filename):
+    """ read-only memory map of the given file (name), for empty files an empty string """
+    if isinstance(file_or_filename, basestring):
+        f = open(file_or_filename, 'rb')
+    else:
+        f = file_or_filename
+    try:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # empty files cannot be mapped
+            buffer = ''
+        # the map stays valid after closing the file, it gets released as soon as no capture refers to it anymore
+        yield buffer
+    finally:
+        if f is not file_or_filename:
+            f.close()
 
 
 # parser specific definitions
@@ -30,7 +106,7 @@ class ParserElementType(object):
     __metaclass__ = abc.ABCMeta
 
     def __call__(self, name, **kwargs):
-        return deepcopy(self).setResultsName(name, **kwargs)
+        return copy(self).setResultsName(name, **kwargs)
 
     @abc.abstractmethod
     def setResultsName(self, name, **kwargs):
@@ -44,6 +120,36 @@ class ParserElementType(object):
         """
         return self
 
+    @abc.abstractmethod
+    def setWhitespaceChars(self, chars):
+        """Overrides the default whitespace chars skipped before this element"""
+        return self
+
+    @abc.abstractmethod
+    def leaveWhitespace(self):
+        """Disables the skipping of whitespace before matching the characters in the
+           C{ParserElement}'s defined pattern (recursively for all contained elements).
+        """
+        return self
+
+    @abc.abstractmethod
+    def setParseAction(self, *fns):
+        """Define actions to perform on successfully matched tokens, replacing earlier ones.
+
+        Unlike pyparsing every action takes a single argument: the captured string for elements with a single
+        result (e.g. C{Word(nums).setParseAction(int)}), else the parse result of the element.
+        The return value replaces it. Actions are part of shaping the result, there is no further pass.
+        Actions are checked by their number of arguments right here: pyparsing's signatures
+        (C{fn(s, loc, toks)}, C{fn(loc, toks)}, C{fn()}) raise a TypeError. CAUTION: pyparsing's C{fn(toks)} takes
+        a single argument as well, hence e.g. C{lambda t: int(t[0])} silently converts only the first character.
+        """
+        return self
+
+    @abc.abstractmethod
+    def addParseAction(self, *fns):
+        """Like C{L{setParseAction}}, however keeping earlier actions (which are applied first)"""
+        return self
+
     @abc.abstractmethod
     def suppress(self):
         """Suppresses the output of this C{ParserElement}; useful to keep punctuation from
@@ -58,7 +164,7 @@ class ParserElementType(object):
         """ repititions is the main structural addition on top of the Structure-type """
         raise NotImplemented()
 
-    def parseString(self, instring, parseAll=False):
+    def parseString(self, instring, parseAll=False, lazy=False, timeout=None):
         """Execute the parse expression with the given string.
         This is the main interface to the client code, once the complete
         expression has been built.
@@ -80,19 +186,41 @@ class ParserElementType(object):
         - explictly expand the tabs in your input string before calling
           C{parseString}
 
+        If ``lazy``, a L{LazyResult} is returned, which builds the nested structure only on access.
+        With ``lazy="compact"`` it is a L{CompactResult}, which keeps only the capture offsets
+        (much less memory when holding on to many results, the same interface;
+        all results of a scan share one L{CompactTable}).
+
+        ``timeout`` limits the matching to that many seconds, exceeding it raises a L{ParseTimeoutError}
+        (instead of hanging on catastrophic backtracking). This needs a regex release supporting timeouts,
+        else a NotImplementedError is raised.
+
         Return ParseResult!
         """
-        return (self+StringEnd() if parseAll else self)._parseString(instring)
+        return (self._parseAllElement() if parseAll else self)._parseString(instring, lazy=lazy, timeout=timeout)
 
     @abc.abstractmethod
-    def _parseString(self, instring):
+    def _parseString(self, instring, capture=None, lazy=False, timeout=None):
         raise NotImplemented()
 
+    def _parseAllElement(self):
+        """ this element followed by C{L{StringEnd()}}, as used with ``parseAll`` """
+        return self+StringEnd()
+
+    def parseFile(self, file_or_filename, parseAll=False, lazy=False):
+        """Execute the parse expression on the given file (name), see L{I{parseString}<parseString>}.
 
-    def scanString(self, instring, maxMatches=_MAX_INT, overlap=False):
-        """not supported: maxMatches
+        The compiled pattern runs directly over a memory map of the file,
+        captured values are returned as L{LazyCapture} offsets into that map,
+        which become strings only when read. Hence memory grows with the matches and not the file size.
+        As files are read binary, the grammar must consist of byte string patterns.
+        """
+        with _mapped_file(file_or_filename) as buffer:
+            return (self._parseAllElement() if parseAll else self)._parseString(buffer, LazyCapture.captures, lazy)
 
-        Scan the input string for expression matches.  Each match will return the
+
+    def scanString(self, instring, maxMatches=_MAX_INT, overlap=False, lazy=False, timeout=None):
+        """Scan the input string for expression matches.  Each match will return the
         matching tokens, start location, and end location.  May be called with optional
         C{maxMatches} argument, to clip scanning after 'n' matches are found.  If
         C{overlap} is specified, then overlapping matches will be reported.
@@ -100,35 +228,111 @@ class ParserElementType(object):
         Note that the start and end locations are reported relative to the string
         being parsed.  See L{I{parseString}<parseString>} for more information on parsing
         strings with embedded tabs.
+
+        Empty matches are not reported, also those which only skipped whitespace (e.g. of a C{ZeroOrMore}
+        after a blank), as match locations begin after that whitespace. pyparsing instead reports these
+        as empty matches at the end of the whitespace.
+        With C{overlap}, matches starting at every position are reported, whereas pyparsing continues after
+        the end of a match which was preceded by skipped whitespace.
+        The input string is never sliced, all matching is done by a single regex search over it.
+        ``timeout`` limits the whole scan to that many seconds, see L{I{parseString}<parseString>}.
         """
-        i = 0
+        if lazy == "compact": # all results share a single offset table
+            lazy = CompactTable(self, instring)
+        for match in self._scanMatches(instring, maxMatches, overlap, timeout):
+            yield self._parseMatch(match, lazy=lazy), match.start(), match.end()
+
+    def scanFile(self, file_or_filename, maxMatches=_MAX_INT, overlap=False, lazy=False):
+        """Like C{L{scanString}}, however scanning a memory mapped file (name), see L{I{parseFile}<parseFile>}"""
+        with _mapped_file(file_or_filename) as buffer:
+            if lazy == "compact":
+                lazy = CompactTable(self, buffer, LazyCapture.captures)
+            for match in self._scanMatches(buffer, maxMatches, overlap):
+                yield self._parseMatch(match, LazyCapture.captures, lazy), match.start(), match.end()
+
+    def scanStream(self, source, chunk_size=_CHUNK_SIZE, maxMatches=_MAX_INT, maxCarry=None):
+        """Like C{L{scanString}}, however reading the input incrementally from ``source``,
+        which is either a file object or an iterable of string chunks.
+
+        Start and end locations are absolute positions within the complete stream.
+        Only the not yet completed tail of the input is kept between chunks
+        (see L{StreamScanner}), hence memory is bounded by the longest match and not by the input size.
+        CAUTION: lookbehinds and C{StringStart} only see this kept tail.
+
+        By default (``maxCarry=None``) this tail is unbounded: a match which might still continue,
+        e.g. C{OneOrMore(Word(alphas))} over a stream without other characters, keeps everything from its start.
+        With ``maxCarry`` given, a pending match spanning more than that many characters raises a L{CarryExceededError}
+        (after all matches completed before it), so that at most about ``maxCarry + chunk_size`` characters are kept.
+        """
+        if hasattr(source, 'read'):
+            source = iter(partial(source.read, chunk_size), '')
+        scanner = StreamScanner(self, maxCarry=maxCarry)
         matches = 0
-        while i < len(instring) and matches < maxMatches:
-            m = self.parseString(instring[i:])
-            if m is not None:
-                yield m
+        for chunk in source:
+            for result in scanner.feed(chunk):
+                yield result
                 matches += 1
-                if overlap:
-                    i += 1
-                else:
-                    i += m.parse_end
-            else:
-                i += 1
+                if matches >= maxMatches:
+                    return
+        for result in scanner.close():
+            yield result
+            matches += 1
+            if matches >= maxMatches:
+                return
+
+    def scanAsync(self, source, chunk_size=_CHUNK_SIZE, maxMatches=_MAX_INT, maxCarry=None,
+                  offload=None, executor=None, encoding=None, loop=None):
+        """Like C{L{scanStream}}, however reading from an asyncio ``source``
+        (``asyncio.StreamReader`` or asynchronous iterator of chunks), see L{pyparsing_regex._async.AsyncScanner}::
+
+            async for tokens, start, end in expr.scanAsync(reader):
+                ...
+
+        Results are available as soon as they are completed by the incoming data.
+        With ``offload`` given, scanning buffers of at least that many characters runs in ``executor``
+        (the loop's default if None), so that the event loop is not blocked.
+        """
+        from pyparsing_regex._async import AsyncScanner
+        return AsyncScanner(self, source, chunk_size, maxMatches, maxCarry, offload, executor, encoding, loop)
+
+    @abc.abstractmethod
+    def _scanMatches(self, instring, maxMatches, overlap, timeout=None):
+        """ generates regex match objects for all non-empty matches within ``instring`` """
+        raise NotImplementedError()
 
+    @abc.abstractmethod
+    def _parseMatch(self, match, capture=None, lazy=False):
+        """ transforms regex match object into parse result (a L{LazyResult} if ``lazy``, see L{parseString})
 
-    def transformString(self, instring):
-        raise NotImplementedError("with regular expressions setParseAction is not supported and thus also not transformString")
-        #maybe later by using regex substitution
+        ``capture(match, group)`` may replace ``match.captures(group)`` for extracting the captured values
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def _getCompiled(self):
+        """ compiled regex pattern, compiled only if needed """
+        raise NotImplementedError()
 
-    def searchString(self, instring, maxMatches=_MAX_INT):
+    @abc.abstractmethod
+    def transformString(self, instring, replacement=None):
+        """Extension to C{L{scanString}}, to modify matching text with modified tokens that may
+           be returned from a parse action (or from ``replacement``, see implementation).
+        """
+        raise NotImplementedError()
+
+    def searchString(self, instring, maxMatches=_MAX_INT, lazy=False, timeout=None):
         """Another extension to C{L{scanString}}, simplifying the access to the tokens found
            to match the given parse expression.  May be called with optional
            C{maxMatches} argument, to clip searching after 'n' matches are found.
         """
-        return list(self.scanString(instring))
+        return [tokens for tokens, start, end in self.scanString(instring, maxMatches, lazy=lazy, timeout=timeout)]
+
+    def searchFile(self, file_or_filename, maxMatches=_MAX_INT, lazy=False):
+        """Like C{L{searchString}}, however searching a memory mapped file (name), see L{I{parseFile}<parseFile>}"""
+        return [tokens for tokens, start, end in self.scanFile(file_or_filename, maxMatches, lazy=lazy)]
 
     def __add__(self, other):
-        base = deepcopy(self)
+        base = copy(self) # cheap, as elements only refer to immutable grammar nodes
         base += other # (+=) == __iadd__
         return base
 
@@ -137,7 +341,7 @@ class ParserElementType(object):
         raise NotImplemented()
 
     def __or__(self, other):
-        base = deepcopy(self)
+        base = copy(self)
         base |= other # (|=) == __ior__
         return base
 
@@ -147,9 +351,311 @@ class ParserElementType(object):
 
     def pprint(self):
         """not implemented in more detail"""
+        from pprint import pformat
         return pformat(repr(self))
 
 
+class StreamScanner(object):
+    """ incremental scanner, consuming input chunk by chunk
+
+    Matching with ``partial=True`` tells a match which might still continue in the next chunk ("needs more input")
+    apart from "no match". However regex prefers any complete match over a partial one, also over a longer one
+    at the same start (e.g. within Optional or OneOrMore) or one at an earlier start.
+    Hence the start of the first match which might still continue is searched separately by ``pending``,
+    the pattern followed by an always failing ``(?!)``: it can only match partially, i.e. by reaching the buffer end.
+    Complete matches are committed only before that start, everything from there on is kept for the next chunk.
+    If ``maxCarry`` is given, a pending match longer than that raises a L{CarryExceededError} on the next call,
+    i.e. after the matches completed so far are returned. (Scanning on from a later position instead would report
+    matches starting within the abandoned one, which scanString never does.) Otherwise the kept tail is unbounded.
+    """
+
+    def __init__(self, element, maxCarry=None):
+        self.element = element
+        self.compiled = element._getCompiled()
+        self.pending = hre.pattern_cache.get("(?:%s)(?!)" % self.compiled.pattern, self.compiled.flags)
+        self.maxCarry = maxCarry
+        self.error = None # CarryExceededError to raise on the next call
+        self.buffer = ''
+        self.offset = 0 # absolute position of self.buffer[0]
+
+    def feed(self, chunk):
+        """ adds ``chunk`` and returns list of all thereby completed ``(tokens, start, end)`` """
+        self.buffer += chunk
+        return list(self._scan(final=False))
+
+    def close(self):
+        """ signals end of input and returns list of the remaining ``(tokens, start, end)`` """
+        results = list(self._scan(final=True))
+        self.buffer = ''
+        return results
+
+    def _scan(self, final):
+        if self.error is not None:
+            raise self.error
+        buffer = self.buffer
+        offset = self.offset
+        end = len(buffer)
+        pos = 0
+        pending = _MAX_INT if final else -1 # start of the first match which might still continue
+        for match in self.compiled.finditer(buffer):
+            if pending < pos:
+                pending = self._pendingStart(buffer, pos)
+            if match.start() >= pending:
+                break
+            if match.end() > match.start():
+                tokens = self.element._parseMatch(match)
+                tokens.parse_end += offset
+                yield tokens, match.start() + offset, match.end() + offset
+                pos = match.end()
+        if pending < pos:
+            pending = self._pendingStart(buffer, pos)
+        if pending >= end: # no match possible, even with more input
+            pos = end
+        elif self.maxCarry is not None and end - pending > self.maxCarry:
+            self.error = CarryExceededError("the match pending at %s spans more than maxCarry=%s characters"
+                                            % (offset + pending, self.maxCarry))
+            pos = end
+        else:
+            pos = pending
+        self.buffer = buffer[pos:]
+        self.offset = offset + pos
+
+    def _pendingStart(self, buffer, pos):
+        found = self.pending.search(buffer, pos, partial=True)
+        return _MAX_INT if found is None else found.start()
+
+
+class LazyCapture(object):
+    """ captured value given by offsets into the matched buffer, only turned into str when read """
+    __slots__ = ('buffer', 'start', 'end')
+
+    def __init__(self, buffer, start, end):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+
+    @staticmethod
+    def captures(match, group):
+        """ replacement for ``match.captures(group)`` without copying any string """
+        buffer = match.string
+        return [LazyCapture(buffer, start, end) for start, end in match.spans(group)]
+
+    def span(self):
+        return self.start, self.end
+
+    def __str__(self):
+        return self.buffer[self.start:self.end]
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __eq__(self, other):
+        return str(self) == (str(other) if isinstance(other, LazyCapture) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+
+class LazyTable(dict):
+    """ drop-in for the flat match table (see ``ParserElement._matchTable``), extracting slots only on access """
+
+    def __init__(self, match, table, capture=None, converters=None):
+        super(LazyTable, self).__init__()
+        self.match = match
+        self.table = table
+        self.capture = capture
+        self.converters = converters or {}
+
+    def __missing__(self, slot):
+        group, repeated = self.table[slot]
+        if repeated:
+            value = self.match.ends(group)
+        elif self.capture is None:
+            value = (self.match.ends(group), self.match.captures(group))
+        else:
+            value = (self.match.ends(group), self.capture(self.match, group))
+        if slot in self.converters:
+            value = (value[0], convert_all(self.converters[slot], value[1]))
+        self[slot] = value
+        return value
+
+
+class ResultView(object):
+    """ common interface of results shaping the Structure only on access, see L{LazyResult} and L{CompactResult}
+
+    Key lookups and integer indexing only resolve the captures needed (as far as the structure allows),
+    everything else, e.g. iteration, ``asList`` or ``asDict``, shapes the complete Structure.
+    Subclasses provide ``_element``, ``build()`` and the ``_table()`` to shape from.
+    """
+    __slots__ = ()
+
+    def _shape_items(self, items):
+        substructs = self._element._plan.substructs
+        shaped = []
+        for item in items:
+            # a fresh table per item, as shaping consumes the captures and items of one name may share slots
+            func = ParserElement._func_parse_leaf(self._table(), substructs)
+            if isinstance(item, Structure):
+                shaped.append(item.map(func, inplace=False))
+            else:
+                # the value of a slot may be the list of its repetitions, possibly of pseudo structures,
+                # a Structure around it flattens them exactly like the Structure's own lookup
+                shaped.extend(Structure(func(item)))
+        return shaped
+
+    def __getitem__(self, index):
+        if getattr(self, '_structure', None) is None:
+            plan = self._element._plan
+            if isinstance(index, (int, long)):
+                if not plan.substructs: # without repetitions, the template has the final shape
+                    return self._shape_items([plan.template[index]])[0]
+            elif isinstance(index, basestring): # everything else, e.g. slices, is taken from the built Structure
+                items = plan.items(index)
+                if items is not None:
+                    return self._shape_items(items)
+        return self.build()[index]
+
+    def keys(self):
+        return self._element._plan.template.keys()
+
+    def asList(self):
+        return list(self.build())
+
+    def asDict(self):
+        return dict((key, self[key]) for key in self.keys())
+
+    def __iter__(self):
+        return iter(self.build())
+
+    def __len__(self):
+        return len(self.build())
+
+    def __str__(self):
+        return str(self.build())
+
+    def __repr__(self):
+        return repr(self.build())
+
+
+class LazyResult(ResultView):
+    """ parse result view backed by the raw regex match, the complete Structure is shaped only once """
+    __slots__ = ('_element', '_match', '_capture', '_structure', 'parse_end')
+
+    def __init__(self, element, match, capture=None):
+        self._element = element
+        self._match = match
+        self._capture = capture
+        self._structure = None
+        self.parse_end = match.end()
+
+    def build(self):
+        """ complete Structure (build only once) """
+        if self._structure is None:
+            self._structure = self._element._parseMatch(self._match, self._capture)
+        return self._structure
+
+    def _table(self):
+        plan = self._element._plan
+        return LazyTable(self._match, plan.table, self._capture, plan.converters)
+
+
+class CompactTable(object):
+    """ flat ``array('l')`` of the capture offsets of many L{CompactResult}s of the same input
+
+    Per result, the offsets list the parse end, then for every slot of the grammar's ShapingPlan
+    (shared by all results, it holds names and nesting) where its captures begin, where the captures end,
+    and then the starts and ends of all captures. Positions are relative to the result's first offset,
+    so that every slot is found in constant time.
+    """
+    __slots__ = ('element', 'string', 'capture', 'offsets')
+
+    def __init__(self, element, string, capture=None):
+        self.element = element
+        self.string = string
+        self.capture = capture
+        self.offsets = array('l')
+
+    def add(self, match):
+        """ stores the offsets of ``match`` and returns its L{CompactResult} """
+        offsets = self.offsets
+        index = len(offsets)
+        all_spans = [match.spans(group) for group in self.element._plan.groups]
+        offsets.append(match.end())
+        position = len(all_spans) + 2
+        for spans in all_spans:
+            offsets.append(position)
+            position += 2 * len(spans)
+        offsets.append(position)
+        for spans in all_spans:
+            for span in spans:
+                offsets.extend(span)
+        return CompactResult(self, index)
+
+
+class CompactResult(ResultView):
+    """ parse result referring to its offsets within a L{CompactTable}, i.e. only two references per result
+
+    This is far smaller than a Structure tree or the regex match, so millions of results can be kept.
+    Nothing gets cached, every access shapes anew.
+    For shaping, it serves as its own match object (``string``, ``spans``, ``ends``, ``captures``, ``end``).
+    """
+    __slots__ = ('_offsets', '_index')
+
+    def __init__(self, offsets, index):
+        self._offsets = offsets
+        self._index = index
+
+    @property
+    def _element(self):
+        return self._offsets.element
+
+    @property
+    def string(self):
+        return self._offsets.string
+
+    @property
+    def parse_end(self):
+        return self._offsets.offsets[self._index]
+
+    def build(self):
+        """ complete Structure (build anew every time) """
+        return self._element._parseMatch(self, self._offsets.capture)
+
+    def _table(self):
+        plan = self._element._plan
+        return LazyTable(self, plan.table, self._offsets.capture, plan.converters)
+
+    def _positions(self, group):
+        """ ``(start, stop)`` of the capture offsets of ``group`` within the offsets """
+        offsets = self._offsets.offsets
+        index = self._index
+        i = index + 1 + self._element._plan.slots[group]
+        return index + offsets[i], index + offsets[i + 1]
+
+    def spans(self, group):
+        offsets = self._offsets.offsets
+        start, stop = self._positions(group)
+        return zip(offsets[start:stop:2], offsets[start + 1:stop:2])
+
+    def ends(self, group):
+        offsets = self._offsets.offsets
+        start, stop = self._positions(group)
+        return list(offsets[start + 1:stop:2])
+
+    def captures(self, group):
+        string = self.string
+        return [string[start:end] for start, end in self.spans(group)]
+
+    def end(self):
+        return self.parse_end
+
+
 #: small helper classes for substructuring:
 class Repeated(object):
     def __init__(self, count, structure):
@@ -159,57 +665,634 @@ class Repeated(object):
     def __str__(self):
         return "Repeated{count: %s, structure: %s}" % (str(self.count), str(self.structure))
 
+    @staticmethod
+    def wrap(structure):
+        """ module level wrapper (no lambda), so that everything stays pickable """
+        return Repeated(Count(), structure)
+
+
+class ConvertedLeaf(object):
+    """ single result leaf with parse actions, which get applied to its captures when shaping """
+    def __init__(self, count, actions):
+        self.count = count
+        self.actions = actions
+
+    def __str__(self):
+        return "ConvertedLeaf{count: %s, actions: %s}" % (str(self.count), str(self.actions))
+
+    @staticmethod
+    def convert(leaf, actions):
+        """ ``leaf`` (a Count or an already converted one) with ``actions`` applied after its earlier ones """
+        if isinstance(leaf, ConvertedLeaf):
+            return ConvertedLeaf(leaf.count, leaf.actions + actions)
+        return ConvertedLeaf(leaf, actions)
+
+
+class ParseAction(object):
+    """ parse actions of a composed element, applied to its shaped substructure """
+    def __init__(self, structure, actions):
+        self.structure = structure
+        self.actions = actions
+
+    def keys(self):
+        """ names within are hidden by the action """
+        return ()
+
+    def apply(self, value):
+        for action in self.actions:
+            value = action(value)
+        return value
+
+    def __str__(self):
+        return "ParseAction{actions: %s, structure: %s}" % (str(self.actions), str(self.structure))
+
+
+def _flatten(tokens):
+    """ list of the strings of all tokens (nested lists and Structures are flattened, None is skipped) """
+    out = []
+    stack = [tokens]
+    while stack:
+        token = stack.pop()
+        if token is None:
+            continue
+        elif isinstance(token, basestring):
+            out.append(token)
+        elif isinstance(token, (list, tuple, Structure)):
+            stack.extend(reversed(list(token)))
+        else:
+            out.append(str(token))
+    return out
+
+
+def _positional_args(fn):
+    """ ``(names, required)`` of the positional arguments of ``fn``, None if unknown (e.g. builtins or ``*args``) """
+    import inspect
+    skip = 0
+    if not (inspect.isfunction(fn) or inspect.ismethod(fn)):
+        fn = getattr(fn, '__call__', None)
+        if not inspect.ismethod(fn):
+            return None
+    if inspect.ismethod(fn) and fn.__self__ is not None:
+        skip = 1
+    try:
+        names, varargs, keywords, defaults = inspect.getargspec(fn)
+    except TypeError:
+        return None
+    if varargs is not None:
+        return None
+    names = names[skip:]
+    return names, len(names) - len(defaults or ())
+
+
+def _check_action(fn):
+    """ raises a TypeError for pyparsing's signatures ``fn()``, ``fn(loc, toks)``, ``fn(s, loc, toks)``
+
+    told by the number of (required) positional arguments like pyparsing's ``_trim_arity``, not by their names
+    """
+    args = _positional_args(fn)
+    if args is not None and (args[1] > 1 or not args[0]):
+        raise TypeError("parse action %r must take a single argument (the matched string or the parse result), "
+                        "pyparsing's signatures with s, loc and toks are not supported" % fn)
+
+
+def convert_all(actions, captures):
+    """ applies ``actions`` to all ``captures`` of a leaf in one go """
+    if captures and isinstance(captures[0], LazyCapture):
+        captures = map(str, captures)
+    for action in actions:
+        captures = map(action, captures)
+    return captures
+
+
+class ShapingPlan(object):
+    """ fixed result-shaping plan, build once per compiled pattern
+
+    ``template`` is the Structure with all leaves replaced by slot indices,
+    ``substructs`` maps slot indices of repetitions to their (equally prepared) substructure and
+    ``table`` is the flat list of ``(regex group, is_repetition)`` per slot
+    and ``converters`` maps slot indices to the parse actions of their captures.
+    Composed elements with parse actions are ParseAction leaves of the template, mapped to themselves in substructs.
+    """
+    def __init__(self, template, substructs, table, converters=None):
+        self.template = template
+        self.substructs = substructs
+        self.table = table
+        self.converters = converters or {}
+        self.groups = tuple(group for group, repeated in table) # regex group per slot
+        self.slots = dict((group, slot) for slot, group in enumerate(self.groups)) # slot per regex group
+        self._items = {}
+        self._columns = None
+
+    def items(self, key):
+        """ template items for results name ``key``, ``None`` if ``key`` is (also) used within repetitions
+
+        Only in the first case the respective values can be shaped without shaping everything.
+        """
+        try:
+            return self._items[key]
+        except KeyError:
+            if any(key in substruct.keys() for substruct in self.substructs.itervalues()):
+                items = None
+            else:
+                items = self.template[key]
+            self._items[key] = items
+            return items
+
+    def convert(self, mymatch):
+        """ applies the parse actions of all leaves to the flat ``mymatch`` table (see _matchTable) """
+        for slot, actions in self.converters.iteritems():
+            ends, captures = mymatch[slot]
+            mymatch[slot] = (ends, convert_all(actions, captures))
+        return mymatch
+
+    def columns(self):
+        """ ``{results name: (regex group, is_repeated)}`` for all names referring to a single captured leaf
+
+        names within repetitions refer to all captures of their leaf
+        """
+        if self._columns is None:
+            names = set(self.template.keys())
+            for substruct in self.substructs.itervalues():
+                names.update(substruct.keys())
+
+            columns = {}
+            for name in names:
+                items = self.items(name)
+                repeated = items is None
+                if repeated:
+                    items = [item for substruct in self.substructs.itervalues() if name in substruct.keys()
+                             for item in substruct[name]]
+                slots = self._leaf_slots(items)
+                if len(slots) == 1 and isinstance(slots[0], int) and not self.table[slots[0]][1]:
+                    columns[name] = (self.table[slots[0]][0], repeated)
+            self._columns = columns
+        return self._columns
+
+    @staticmethod
+    def _leaf_slots(items):
+        slots = []
+        for item in items:
+            if isinstance(item, Structure):
+                item.map(slots.append, inplace=False)
+            else:
+                slots.append(item)
+        return slots
+
+    def __str__(self):
+        return "ShapingPlan{table: %s, template: %s}" % (str(self.table), str(self.template))
+
+
+def match_table(match, table, capture=None):
+    """ flat extraction of everything needed from ``match``, i.e. ends and captures per slot of ``table`` """
+    if capture is None:
+        return [match.ends(group) if repeated else (match.ends(group), match.captures(group))
+                for group, repeated in table]
+    else:
+        return [match.ends(group) if repeated else (match.ends(group), capture(match, group))
+                for group, repeated in table]
+
+
+class LeafParser(object):
+    """ maps the slot indices of a ShapingPlan template to their values within the flat ``mymatch`` table
+
+    CAUTION: for this map to work correctly,
+    every leaf must already be a slot index (recursively!)
+    i.e. map it over the template of a ShapingPlan.
+    Values are consumed from ``mymatch``, as optional or repeated elements may be missing from any repetition.
+
+    This is the pure Python version, the compiled one of ``_core_cython`` is used instead if selected.
+    """
+    __slots__ = ('mymatch', 'substructs', 'maxend')
+
+    def __init__(self, mymatch, substructs, maxend=None):
+        self.mymatch = mymatch
+        self.substructs = substructs
+        self.maxend = maxend # only values ending before are part of the current repetition
+
+    def __call__(self, leaf):
+        substruct = self.substructs.get(leaf)
+        if substruct is None: # base case, this is always a single entry
+            # we have to check ends as optional fields might get skipped and do not appear at all in ends/captures
+            ends, captures = self.mymatch[leaf]
+            if not ends or self.maxend is not None and ends[0] > self.maxend:
+                return ParserElement.EMPTY # nothing matched at all or not within the current repetition
+            del ends[0]
+            return captures.pop(0)
+
+        if isinstance(substruct, ParseAction):
+            return substruct.apply(substruct.structure.map(self, inplace=False))
+
+        # Repeated structure, repeated elements have ends while leafs have captures
+        # a simple list is returned, which is flattened out automatically
+        # (same effect as pseudo structure, however one could process this repetitions further,
+        # e.g. keeping only last repition like it is done in pyparsing for default)
+        ends = self.mymatch[leaf]
+        repetitions = []
+        for i, end in enumerate(ends):
+            if self.maxend is not None and end > self.maxend:
+                del ends[:i] # delete everything parsed so far
+                break
+            repetitions.append(substruct.map(LeafParser(self.mymatch, self.substructs, end), inplace=False))
+        return repetitions
+
+
+# persistent grammar representation
+# ==================================
+# ParserElements only refer to an immutable tree of the following nodes, which is shared between elements.
+# Hence composing elements is O(1) and nothing needs to be copied;
+# pattern and Structure are build from the tree only when needed (see build_node)
+
+PatternNode = namedtuple("PatternNode", ["pattern", "silent", "literal", "whitespace"])
+# literal is only known for Literal, used for the trie of alternatives,
+# whitespace are the chars skipped before the pattern (None: leave whitespace)
+PatternNode.__new__.__defaults__ = (None, None)
+ConcatNode = namedtuple("ConcatNode", ["left", "right"])
+AltNode = namedtuple("AltNode", ["left", "right"])
+GroupNode = namedtuple("GroupNode", ["node", "wrapper", "pseudo", "liftkeys", "silent"])
+ResultsNameNode = namedtuple("ResultsNameNode", ["node", "name"])
+NameNode = namedtuple("NameNode", ["node", "name"])
+SuppressNode = namedtuple("SuppressNode", ["node"])
+RepeatNode = namedtuple("RepeatNode", ["node", "min", "max"])
+OptionalNode = namedtuple("OptionalNode", ["node"])
+ActionNode = namedtuple("ActionNode", ["node", "actions"])
+WhitespaceNode = namedtuple("WhitespaceNode", ["node", "chars"])
+
+
+def leading_whitespace(node):
+    """ whitespace chars skipped at the very beginning of ``node``, like in pyparsing given by the first token """
+    while True:
+        node_type = type(node)
+        if node_type is PatternNode:
+            return node.whitespace
+        elif node_type is WhitespaceNode:
+            return node.chars
+        elif node_type is ConcatNode or node_type is AltNode:
+            node = node.left
+        else:
+            node = node.node
+
+
+def skip_before(node):
+    """ ``node`` (which may match nothing) skipping the leading whitespace of its first token in any case
+
+    like pyparsing, where Optional and ZeroOrMore skip whitespace before trying their expression,
+    i.e. the whitespace is consumed also if the expression does not match
+    """
+    whitespace = leading_whitespace(node)
+    return WhitespaceNode(node, whitespace) if whitespace else node
+
+
+def drop_actions(node):
+    """ ``node`` without its parse actions, also those beneath its names """
+    node_type = type(node)
+    if node_type is ActionNode:
+        return drop_actions(node.node)
+    elif node_type is ResultsNameNode or node_type is NameNode:
+        return node._replace(node=drop_actions(node.node))
+    return node
+
+
+def leave_whitespace(node):
+    """ copy of the tree ``node`` without any whitespace skipping """
+    node_type = type(node)
+    if node_type is PatternNode:
+        return node._replace(whitespace=None)
+    elif node_type is WhitespaceNode:
+        return leave_whitespace(node.node)
+    elif node_type is ConcatNode or node_type is AltNode:
+        # iteratively along the left spine, as chains of (+) or (|) can be long
+        rights = []
+        while type(node) is node_type:
+            rights.append(node.right)
+            node = node.left
+        node = leave_whitespace(node)
+        for right in reversed(rights):
+            node = node_type(node, leave_whitespace(right))
+        return node
+    else:
+        return node._replace(node=leave_whitespace(node.node))
+
+
+def drop_leading_whitespace(node, chars, alternative=False):
+    """ copy of the tree ``node`` without the skip of its first token, where ``chars`` are skipped already
+
+    like in pyparsing, the first token of an And or of a Group, Optional, ... is never pre-parsed, whatever
+    its whitespace chars. The alternatives of a MatchFirst however skip their own whitespace, hence there
+    (``alternative``) only skips of the very same ``chars`` are dropped.
+    """
+    node_type = type(node)
+    if node_type is PatternNode:
+        return node._replace(whitespace=None) if not alternative or node.whitespace == chars else node
+    elif node_type is WhitespaceNode:
+        if not alternative or node.chars == chars:
+            return drop_leading_whitespace(node.node, chars, alternative)
+        return node
+    elif node_type is ConcatNode:
+        # iteratively along the left spine, as chains of (+) can be long
+        concats = []
+        while type(node) is ConcatNode:
+            concats.append(node)
+            node = node.left
+        node = drop_leading_whitespace(node, chars, alternative)
+        for concat in reversed(concats):
+            node = concat._replace(left=node)
+        return node
+    elif node_type is AltNode:
+        # every alternative starts at the very beginning
+        rights = []
+        while type(node) is AltNode:
+            rights.append(node.right)
+            node = node.left
+        node = drop_leading_whitespace(node, chars, True)
+        for right in reversed(rights):
+            node = AltNode(node, drop_leading_whitespace(right, chars, True))
+        return node
+    elif node_type is RepeatNode:
+        return node # the skip is part of every repetition
+    else:
+        return node._replace(node=drop_leading_whitespace(node.node, chars, alternative))
+
+
+def literal_alternatives(node):
+    """ list of literal strings if ``node`` is an alternative of plain Literals only, else None """
+    literals = []
+    whitespaces = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if type(node) is AltNode:
+            stack.append(node.right)
+            stack.append(node.left)
+        elif type(node) is PatternNode and node.literal is not None and not node.silent:
+            literals.append(node.literal)
+            whitespaces.add(node.whitespace)
+        else:
+            return None
+    if len(whitespaces) > 1:
+        return None
+    return literals
+
+
+def build_node(node):
+    """ builds fresh ``(pattern, structure, name)`` out of the grammar tree ``node`` """
+    node_type = type(node)
+
+    if node_type is AltNode:
+        literals = literal_alternatives(node)
+        if literals is not None and all(literals):
+            # a single prefix trie with a single Count instead of one group per alternative
+            pattern = hre.group(hre.literals_pattern(literals))
+            return hre.skip_whitespace(leading_whitespace(node)) + pattern, Structure(Count()), pattern
+
+    if node_type is PatternNode:
+        # whitespace is skipped outside of the group, i.e. it never becomes part of the result
+        if node.silent:
+            # create empty Structure:
+            return hre.skip_whitespace(node.whitespace) + node.pattern, Structure(), node.pattern
+        else:
+            # create Count() Structure
+            pattern = hre.group(node.pattern)  # for every Count() there must be a group
+            return hre.skip_whitespace(node.whitespace) + pattern, Structure(Count()), pattern
+
+    if node_type is ConcatNode or node_type is AltNode:
+        # long chains of (+) or (|) are build iteratively and joined only once
+        rights = []
+        while type(node) is node_type:
+            rights.append(node.right)
+            node = node.left
+        rights.reverse()
+        pattern, structure, name = build_node(node)
+        patterns = [pattern]
+        names = [name]
+        for right in rights:
+            pattern, substructure, name = build_node(right)
+            structure += substructure
+            if node_type is ConcatNode:
+                patterns.append(pattern)
+                names.append(name)
+            else:
+                # every (|) adds a pseudo group to the structure,
+                # the pattern however stays a single flat alternation (nesting would be equivalent, but deep)
+                patterns.append("|" + pattern)
+                names.append("|" + name)
+                structure.group(pseudo=True, liftkeys=True)
+        if node_type is AltNode:
+            return hre.silent_group("".join(patterns)), structure, "".join(names)
+        return "".join(patterns), structure, "".join(names)
+
+    if node_type is WhitespaceNode: # the first tokens' own skips would only match empty after its skip
+        pattern, structure, name = build_node(drop_leading_whitespace(node.node, node.chars))
+    else:
+        pattern, structure, name = build_node(node.node)
+
+    if node_type is GroupNode:
+        structure.group(node.wrapper, pseudo=node.pseudo, liftkeys=node.liftkeys)
+        # normal grouping is done by Structure type,
+        # but silent groups are nevertheless needed for correct regex semantics:
+        if node.silent is None:
+            pass # keep old pattern, this is mainly needed for pseudo groups like created for ResultNames
+        elif node.silent:
+            pattern = hre.ensure_grouping(pattern)
+        else:
+            pattern = hre.group(pattern)
+
+    elif node_type is ResultsNameNode:
+        structure.set_name(node.name)
+
+    elif node_type is NameNode:
+        name = node.name
+
+    elif node_type is SuppressNode:
+        pattern = hre.silence_captures(pattern)
+        structure.clear()
+
+    elif node_type is RepeatNode:
+        # if there is at most one real group in the pattern,
+        # then there is no structure so far at all
+        # and thus we do not have to group, but just can repeat
+        # (mind by .suppress() there may also be zero real groups, which also don't have to be grouped)
+        # additionally, there is also no need for a further nesting if the sub group was just repeated
+        struct_iter = iter(structure)
+        firstelem = next(struct_iter)
+        try:
+            next(struct_iter)
+            struct_len_1 = False
+        except StopIteration:
+            struct_len_1 = True
+
+        if struct_len_1 and isinstance(firstelem, Repeated):
+            # prevent nested repeatings Repeat(Repeat)
+            pattern = hre.ensure_grouping(pattern)
+
+        else:
+            # the grouping is done by wrapping into a Leaf,
+            # so that we can construct a map function which does all restructuring of the regex output
+            structure.group(
+                Repeated.wrap, # creates a complete Structure element
+                pseudo = True, # pass everything through
+                liftkeys = True, # pass everything through
+            )
+            pattern = hre.group(pattern) # this adds a grouping level also in the pattern
+
+        if node.max is None:
+            pattern = r"%s{%s,}"   % (pattern, node.min)
+        elif node.min == node.max:
+            pattern = r"%s{%s}"    % (pattern, node.min)
+        else:
+            pattern = r"%s{%s,%s}" % (pattern, node.min, node.max)
+
+    elif node_type is OptionalNode:
+        pattern = r"%s?" % hre.ensure_grouping(pattern)
+
+    elif node_type is WhitespaceNode:
+        pattern = hre.skip_whitespace(node.chars) + pattern
+
+    elif node_type is ActionNode:
+        leaves = []
+        structure.map(leaves.append, inplace=False)
+        if len(leaves) == 1 and isinstance(leaves[0], (Count, ConvertedLeaf)):
+            # single capture: actions get fused into extracting the captures (see ShapingPlan.convert)
+            structure.map(partial(ConvertedLeaf.convert, actions=node.actions))
+        else:
+            structure.group(partial(ParseAction, actions=node.actions), pseudo=True)
+
+    else:
+        raise TypeError("unknown grammar node %r" % node_type)
+
+    return pattern, structure, name
+
 
 class ParserElement(ParserElementType):
     """
     we can immitate arbitrarily complex formula directly by a single regex-string
     the output gets restructured (in linear time) to fulfil ParserElement/Structure interface
 
-    not implemented: whitespaces support
+    like in pyparsing every token skips leading whitespace, which is compiled into the pattern as well
     """
 
     EMPTY = None
+    DEFAULT_WHITE_CHARS = " \n\t\r"
 
     # CONSTRUCTION
     # ============
 
     def __init__(self, pattern, silent=False):
-        if silent:
-            # create empty Structure:
-            self.structure = Structure()
-            self.pattern = pattern
-            self.name = self.pattern
-        else:
-            # create Count() Structure
-            self.structure = Structure(Count())
-            self.pattern = hre.group(pattern)  # for every Count() there must be a group
-            self.name = self.pattern
+        """
+
+        Parameters
+        ----------
+        pattern : str
+            regular expression pattern which shall be matched by this entitity
+        silent : bool
+            indicating, whether this pattern shall be listed in the Structure output format
+        """
+        self._node = PatternNode(pattern, silent, None, ParserElement.DEFAULT_WHITE_CHARS)
+        self._reset()
+
+    def _reset(self):
+        """ to be called whenever self._node changed """
+        self._built = None
         self._compiled = None
+        self._plan = None
+        self._prefilter = None
+        self._parseAll = None
+        self.minimizeStats = None
+
+    def _build(self):
+        if self._built is None:
+            self._built = build_node(self._node)
+        return self._built
+
+    @property
+    def pattern(self):
+        return self._build()[0]
+
+    @property
+    def compiledPattern(self):
+        """ ``pattern`` as compiled: leading whitespace is skipped before the start of the match (``\\K``),
+        so that like in pyparsing match locations begin after it """
+        if not leading_whitespace(self._node):
+            return self.pattern
+        return self._buildCompiled()[0]
+
+    def _buildCompiled(self):
+        """ ``compiledPattern`` together with a fresh structure (to be changed by the plan), from a single build """
+        whitespace = leading_whitespace(self._node)
+        if not whitespace:
+            pattern, structure, name = build_node(self._node)
+            return pattern, structure
+        # the first tokens' own skips would only match empty after it
+        pattern, structure, name = build_node(drop_leading_whitespace(self._node, whitespace))
+        return r"%s\K%s" % (hre.skip_whitespace(whitespace), pattern), structure
+
+    def _parseAllElement(self):
+        if self._parseAll is None:
+            self._parseAll = self+StringEnd()
+        return self._parseAll
+
+    @property
+    def structure(self):
+        """ CAUTION: shared, do not change inplace """
+        return self._build()[1]
+
+    @property
+    def name(self):
+        return self._build()[2]
 
     # LOGIC
     # =====
+    # everything is inplace, however only by replacing self._node
 
     def group(self, wrapper=None, pseudo=False, liftkeys=False, silent=None):
-        # this is inplace:
-        self.structure.group(wrapper, pseudo=pseudo, liftkeys=liftkeys)
-        # normal grouping is done by Structure type,
-        # but silent groups are nevertheless needed for correct regex semantics:
-        if silent is None:
-            pass # keep old self.pattern, this is mainly needed for pseudo groups like created for ResultNames
-        elif silent:
-            self.pattern = hre.ensure_grouping(self.pattern)
-        else:
-            self.pattern = hre.group(self.pattern)
-        self._compiled = None
+        self._node = GroupNode(self._node, wrapper, pseudo, liftkeys, silent)
+        self._reset()
         return
 
     def setResultsName(self, name, **kwargs):
         """ kwargs are for compatibility with pyparsing interface """
-        self.structure.set_name(name)
+        self._node = ResultsNameNode(self._node, name)
+        self._reset()
         return self
 
     def setName(self, name):
-        self.name = name
+        """ set name of this ParserElement """
+        self._node = NameNode(self._node, name)
+        self._reset()
+        return self
+
+    @staticmethod
+    def setDefaultWhitespaceChars(chars):
+        """ whitespace chars skipped by all ParserElements created from now on """
+        ParserElement.DEFAULT_WHITE_CHARS = chars
+
+    def setWhitespaceChars(self, chars):
+        node = self._node
+        if type(node) is PatternNode:
+            self._node = node._replace(whitespace=chars)
+        else:
+            if type(node) is WhitespaceNode:
+                node = node.node
+            self._node = WhitespaceNode(node, chars)
+        self._reset()
+        return self
+
+    def leaveWhitespace(self):
+        self._node = leave_whitespace(self._node)
+        self._reset()
+        return self
+
+    def setParseAction(self, *fns):
+        self._node = drop_actions(self._node)
+        return self.addParseAction(*fns)
+
+    def addParseAction(self, *fns):
+        for fn in fns:
+            _check_action(fn)
+        if type(self._node) is ActionNode:
+            self._node = ActionNode(self._node.node, self._node.actions + fns)
+        else:
+            self._node = ActionNode(self._node, fns)
+        self._reset()
         return self
 
     def suppress(self):
@@ -220,97 +1303,330 @@ class ParserElement(ParserElementType):
 
            CAUTION: NOT REVERSIBLE!
         """
-        self.pattern = hre.begins_not_silently_grouped.sub("(?:", self.pattern)
-        self._compiled = None
-        self.structure.clear()
+        self._node = SuppressNode(self._node)
+        self._reset()
         return self
 
     def repeat(self, min=0, max=None):
         """ repeat on arbitrary ParserElement """
         if max is not None and min > max:
             raise RuntimeError("min <= max needed")
+        self._node = RepeatNode(self._node, min, max)
+        if min == 0:
+            self._node = skip_before(self._node)
+        self._reset()
 
-        # if there is at most one real group in the pattern,
-        # then there is no structure so far at all
-        # and thus we do not have to group, but just can repeat
-        # (mind by .suppress() there may also be zero real groups, which also don't have to be grouped)
-        # additionally, there is also no need for a further nesting if the sub group was just repeated
-        struct_iter = iter(self.structure)
-        firstelem = next(struct_iter)
-        try:
-            next(struct_iter)
-            struct_len_1 = False
-        except StopIteration:
-            struct_len_1 = True
+    def optional(self):
+        """ makes this ParserElement optional """
+        self._node = skip_before(OptionalNode(self._node))
+        self._reset()
 
-        if struct_len_1 and isinstance(firstelem, Repeated):
-            # prevent nested repeatings Repeat(Repeat)
-            self.pattern = hre.ensure_grouping(self.pattern)
+    def compile(self):
+        """ compiles regex together with the result-shaping plan
 
+        the pattern is minimized before, see ``hre.minimize``; what got removed is available as ``minimizeStats``
+        """
+        pattern, structure = self._buildCompiled()
+        if _profile.enabled:
+            plan = _profile.call(self.name, 'plan', self._compile_plan, structure)
+            pattern, stats, tree = _profile.call(self.name, 'minimize', hre.minimize_tree, pattern,
+                                                 [not repeated for group, repeated in plan.table])
+            compiled = _profile.call(self.name, 'compile', hre.pattern_cache.get, pattern)
         else:
-            # the grouping is done by wrapping into a Leaf,
-            # so that we can construct a map function which does all restructuring of the regex output
-            self.group(
-                wrapper = lambda structure: Repeated(Count(), structure), # creates a complete Structure element
-                pseudo = True, # pass everything through
-                liftkeys = True, # pass everything through
-                silent = False, # this adds a grouping level also in the pattern
-            )
-        if max is None:
-            self.pattern = r"%s{%s,}"   % (self.pattern, min)
-        elif min == max:
-            self.pattern = r"%s{%s}"    % (self.pattern, min)
+            plan = self._compile_plan(structure)
+            pattern, stats, tree = hre.minimize_tree(pattern, [not repeated for group, repeated in plan.table])
+            compiled = hre.pattern_cache.get(pattern)
+        self.minimizeStats = stats
+        for construct in hre.risky_constructs(pattern, tree):
+            warnings.warn("%r may backtrack catastrophically, consider parsing with a timeout" % construct,
+                          BacktrackingWarning, stacklevel=_user_stacklevel())
+        # plan first, as other threads take an existing self._compiled as sign that everything is ready
+        self._plan = plan
+        self._prefilter = hre.scan_prefilter(pattern, tree)
+        self._compiled = compiled
+        return compiled
+
+    def _getCompiled(self):
+        if self._compiled is None:
+            self.compile()
+        return self._compiled
+
+    def _parseString(self, instring, capture=None, lazy=False, timeout=None):
+        """starts matchin at starts of ``instring`` - no search"""
+        if timeout is not None:
+            _check_timeouts()
+            try:
+                match = self._getCompiled().match(instring, timeout=timeout)
+            except _RegexTimeout as e:
+                if not _timed_out(e):
+                    raise
+                raise _timeout_error(timeout)
+        elif _profile.enabled:
+            match = _profile.call(self.name, 'match', self._getCompiled().match, instring)
         else:
-            self.pattern = r"%s{%s,%s}" % (self.pattern, min, max)
-        self._compiled = None
+            match = self._getCompiled().match(instring)
+        if match is None:
+            return None
+        return self._parseMatch(match, capture, lazy)
+
+    def _scanMatches(self, instring, maxMatches, overlap, timeout=None):
+        """ single pass over ``instring`` by the compiled pattern, no slicing of the input
+
+        (overlapped search is natively supported by the regex module)
+        Non-overlapping scans are prefiltered, see ``hre.scan_prefilter``: inputs missing a required literal
+        are not searched at all, and leading whitespace is not searched for if not needed."""
+        if timeout is not None:
+            _check_timeouts()
+        compiled = self._getCompiled()
+        if not overlap:
+            search, required = self._prefilter
+            if required and instring.find(required) < 0:
+                return iter(())
+            if search is not None:
+                compiled = hre.pattern_cache.get(search)
+        if timeout is not None:
+            matches = self._timed(compiled.finditer(instring, overlapped=overlap, timeout=timeout), timeout)
+        else:
+            matches = compiled.finditer(instring, overlapped=overlap)
+        if _profile.enabled:
+            matches = _profile.iterate(self.name, 'match', matches)
+        return islice((m for m in matches if m.end() > m.start()), maxMatches)
 
+    @staticmethod
+    def _timed(matches, timeout):
+        """ ``matches`` with regex's timeout turned into L{ParseTimeoutError} """
+        try:
+            for match in matches:
+                yield match
+        except _RegexTimeout as e:
+            if not _timed_out(e):
+                raise
+            raise _timeout_error(timeout)
+
+    def _parseMatch(self, match, capture=None, lazy=False):
+        """ fills a fresh Structure straight from the match, following the precompiled plan """
+        if isinstance(lazy, CompactTable):
+            return lazy.add(match)
+        if lazy == "compact":
+            return CompactTable(self, match.string, capture).add(match)
+        if lazy:
+            return LazyResult(self, match, capture)
+        if _profile.enabled:
+            start = _profile.default_timer()
+            result = self._shape(self._matchTable(match, self._plan.table, capture), match.end())
+            _profile.record(self.name, 'shape', _profile.default_timer() - start)
+            return result
+        return self._shape(self._matchTable(match, self._plan.table, capture), match.end())
 
-    def compile(self):
-        # compile regex (should optimize itself)
-        self._compiled = regex.compile(self.pattern)
+    @staticmethod
+    def _matchTable(match, table, capture=None):
+        """ flat extraction of everything needed from ``match``, i.e. ends and captures per slot """
+        return _shaping.match_table(match, table, capture)
+
+    def _shape(self, mymatch, parse_end):
+        """ builds the Structure out of the flat ``mymatch`` table (see _matchTable) """
+        plan = self._plan
+        if plan.converters:
+            plan.convert(mymatch)
+        struct = plan.template.map(self._func_parse_leaf(mymatch, plan.substructs), inplace=False)
+        struct.parse_end = parse_end
+        return struct
 
-        return self._compiled
+    def parseMany(self, iterable, workers=None, chunksize=64, ordered=True, parseAll=False):
+        """ C{L{parseString}} on every record of ``iterable``, distributed over a pool of ``workers`` processes
 
-    def _parseString(self, instring):
-        """starts matchin at starts of ``instring`` - no search
+        Every worker gets the compiled pattern and its slot table only once,
+        the records are matched there and only flat match tables are send back,
+        which get shaped into Structures here.
 
-        this is copying everything beforehand"""
+        If ``ordered``, results are generated in input order,
+        otherwise ``(index, result)`` is generated as soon as the respective record is done.
+        """
+        from pyparsing_regex._parallel import map_records, parse_record
+
+        elem = self._parseAllElement() if parseAll else self
+        elem._getCompiled()
+        for index, table in map_records(parse_record, elem._compiled.pattern, elem._plan.table,
+                                        iterable, workers, chunksize, ordered):
+            result = None if table is None else elem._shape(table[1], table[0])
+            yield result if ordered else (index, result)
+
+    def searchMany(self, iterable, workers=None, chunksize=64, ordered=True):
+        """ C{L{searchString}} on every record of ``iterable``, distributed like in C{L{parseMany}} """
+        from pyparsing_regex._parallel import map_records, search_record
+
+        self._getCompiled()
+        for index, tables in map_records(search_record, self._compiled.pattern, self._plan.table,
+                                         iterable, workers, chunksize, ordered):
+            result = [self._shape(table, end) for end, table in tables]
+            yield result if ordered else (index, result)
+
+    def transformString(self, instring, replacement=None):
+        """Extension to C{L{scanString}}, to modify matching text with modified tokens that may
+           be returned from a parse action. Every match is replaced by its tokens joined together
+           (i.e. suppressed parts vanish, parse actions apply), everything else is kept.
+
+           ``replacement`` may instead be a template string like C{r"<\\g<key>>"}, which gets translated to
+           regex group numbers and is done by a single ``regex.sub`` (CAUTION: like with ``regex.sub`` also empty
+           matches get replaced), or a callable taking the parse result and returning the replacement string.
+        """
+        compiled = self._getCompiled()
+        if isinstance(replacement, basestring):
+            return compiled.sub(self._groupTemplate(replacement), instring)
+
+        plan = self._plan
+        if replacement is None:
+            if any(isinstance(substruct, ParseAction) for substruct in plan.substructs.itervalues()):
+                replace = lambda match: _flatten(self._parseMatch(match))
+            else:
+                # no need to shape anything, all captured leaves are just joined in order
+                leaves = [(group, plan.converters.get(slot))
+                          for slot, (group, repeated) in enumerate(plan.table) if not repeated]
+                def replace(match):
+                    spans = sorted(((start, end, actions) for group, actions in leaves
+                                    for start, end in match.spans(group)), key=itemgetter(0))
+                    return [instring[start:end] if actions is None
+                            else str(convert_all(actions, [instring[start:end]])[0])
+                            for start, end, actions in spans]
+        else:
+            replace = lambda match: [str(replacement(self._parseMatch(match)))]
+
+        out = []
+        last_end = 0
+        for match in self._scanMatches(instring, _MAX_INT, False):
+            out.append(instring[last_end:match.start()])
+            out.extend(replace(match))
+            last_end = match.end()
+        out.append(instring[last_end:])
+        return "".join(out)
+
+    def _groupTemplate(self, template):
+        """ translates ``\\g<results name>`` in a ``regex.sub`` template to the respective group number """
+        self._getCompiled()
+        columns = self._plan.columns()
+        def group_number(match):
+            name = match.group(1)
+            if name.isdigit():
+                return match.group(0)
+            try:
+                return r"\g<%s>" % columns[name][0]
+            except KeyError:
+                raise KeyError("no single captured leaf for results name %r" % name)
+        return hre.template_group.sub(group_number, template)
+
+    def spanIndex(self):
+        """ ``{results name: index}`` into the spans given by C{L{matchSpans}} / C{L{scanSpans}}
+
+        (for all names referring to a single captured leaf, see C{L{searchColumns}})
+        """
+        self._getCompiled()
+        plan = self._plan
+        return dict((name, plan.slots[group]) for name, (group, repeated) in plan.columns().iteritems())
 
-        if self._compiled is None:
-            self.compile()
+    def matchSpans(self, instring):
+        """ fast path of C{L{parseString}} without any result shaping
 
-        match = self._compiled.match(instring)
+        returns None if not matching, else ``(start, end, spans)`` with one list of ``(start, end)``
+        per result slot (all captures of a leaf or all repetitions of a repeated element), in the order of
+        the Structure leaves. Use C{L{spanIndex}} to look up slots by results name.
+        """
+        match = self._getCompiled().match(instring)
         if match is None:
             return None
-
-        Count.reset()
-        struct = deepcopy(self.structure)
-
-        mymatch, substructs, preprocess_func = self._parse_preprocess(match)
-        struct.map(preprocess_func)
-        struct.map(self._func_parse_leaf(mymatch, substructs))
-        struct.parse_end = match.end()
-        return struct
+        return match.start(), match.end(), tuple(map(match.spans, self._plan.groups))
+
+    def scanSpans(self, instring, maxMatches=_MAX_INT, overlap=False):
+        """ fast path of C{L{scanString}}, generating ``(start, end, spans)`` like C{L{matchSpans}} """
+        self._getCompiled()
+        groups = self._plan.groups
+        for match in self._scanMatches(instring, maxMatches, overlap):
+            yield match.start(), match.end(), tuple(map(match.spans, groups))
+
+    def searchColumns(self, instring, maxMatches=_MAX_INT, names=None, asNumpy=False):
+        """ C{L{searchString}} in columnar form, without building any per match Structure
+
+        returns ``(starts, ends, columns)``: start and end offsets of all matches as ``array('l')``
+        and ``{results name: list of captures}``. Only names referring to a single captured leaf are supported,
+        names within repetitions give a list of all their captures per match, unmatched optional ones None.
+        Parse actions of the leaves are applied to whole columns at once.
+        ``names`` restricts the columns (by default all supported names).
+        With ``asNumpy`` offsets become int arrays (without copying) and columns object arrays.
+        """
+        self._getCompiled()
+        available = self._plan.columns()
+        if names is None:
+            names = sorted(available)
+        unsupported = [name for name in names if name not in available]
+        if unsupported:
+            raise KeyError("no single captured leaf for results names %s" % unsupported)
+
+        starts = array('l')
+        ends = array('l')
+        columns = dict((name, []) for name in names)
+        single = [(columns[name].append, available[name][0]) for name in names if not available[name][1]]
+        repeated = [(columns[name].append, available[name][0]) for name in names if available[name][1]]
+        add_start = starts.append
+        add_end = ends.append
+        for match in self._scanMatches(instring, maxMatches, False):
+            add_start(match.start())
+            add_end(match.end())
+            for add, group in single:
+                add(match.group(group))
+            for add, group in repeated:
+                add(match.captures(group))
+
+        # parse actions are applied column by column
+        for name in names:
+            group, is_repeated = available[name]
+            actions = self._plan.converters.get(group - 1)
+            if not actions:
+                continue
+            column = columns[name]
+            if is_repeated:
+                columns[name] = [convert_all(actions, captures) for captures in column]
+            elif None in column:
+                columns[name] = [value if value is None else convert_all(actions, [value])[0] for value in column]
+            else:
+                columns[name] = convert_all(actions, column)
+
+        if asNumpy:
+            import numpy
+            starts = numpy.frombuffer(starts, dtype=numpy.dtype('l'))
+            ends = numpy.frombuffer(ends, dtype=numpy.dtype('l'))
+            for name, column in columns.iteritems():
+                array_ = numpy.empty(len(column), dtype=object)
+                array_[:] = column
+                columns[name] = array_
+        return starts, ends, columns
 
     @staticmethod
-    def _parse_preprocess(match):
-        """ evals Counts, transforms match, and dumps structures for repititions
-
-        attention! match_transformed as first argument, substructs as third and function as last
-        however match_transformed (substructs) are still empty initially and will be set by running the
-        function
+    def _compile_plan(template):
+        """ replaces all Counts by fixed slots and builds the ShapingPlan, ``template`` is changed inplace
 
-        :param match: to be transformed
-        :return: match_transformed, substructs, preprocess_func
+        the slots are numbered in the same (depth-first) order in which the regex numbers its groups,
+        hence slot ``i`` always refers to regex group ``i + 1``.
+        The numbering is local to this call (the Counts are only placeholders and are not evaluated),
+        so grammars can be compiled and parsed from several threads at once.
         """
-        match_transformed = []
-        substructs = {} #{Count: substruct}
+        substructs = {} #{slot: substruct}
+        table = []
+        converters = {} #{slot: parse actions}
         def preprocess_func(leaf):
-            """ evaluates all Count instances so that they refer to fixed group """
-            if isinstance(leaf, Repeated):
-                new_leaf = leaf.count.value # evaluates and stores value directly
+            """ replaces all Count instances by the next free slot """
+            new_leaf = len(table)
+            if isinstance(leaf, ParseAction):
+                # no group of its own, the leaf stays and refers to itself
+                leaf.structure.map(preprocess_func)
+                substructs[leaf] = leaf
+                return leaf
+
+            if isinstance(leaf, ConvertedLeaf):
+                converters[new_leaf] = leaf.actions
+                table.append((new_leaf + 1, False))
+
+            elif isinstance(leaf, Repeated):
                 # CAUTION: +1 as we now start counting at 0, but regex start counting at 1 for groups
-                match_transformed.append(match.ends(new_leaf + 1))
+                table.append((new_leaf + 1, True))
                 # recursive call
                 leaf.structure.map(preprocess_func)
                 # from here on everything is executed depth first (by recursion)
@@ -318,62 +1634,23 @@ class ParserElement(ParserElementType):
 
             # elif isinstance(leaf, Count):
             else: #there should be no other case
-                new_leaf = leaf.value # evaluates and stores value directly
-                # CAUTION: +1 as we now start counting at 0, but regex start counting at 1 for groups
-                match_transformed.append((match.ends(new_leaf + 1), match.captures(new_leaf + 1)))
+                table.append((new_leaf + 1, False))
 
             return new_leaf # new_leaf is int
 
-        return match_transformed, substructs, preprocess_func
-
+        template.map(preprocess_func)
+        return ShapingPlan(template, substructs, table, converters)
 
     @staticmethod
     def _func_parse_leaf(mymatch, substructs):
-        """
-        CAUTION: for this map to work correctly,
-        every Count instance must be evaluated and directly available (recursively!)
-        i.e. first map ParserElement._recursive_evalcount
-        """
-        def recursive_parse(leaf, maxend=None):
-            try: # Repeated structure
-                substruct = substructs[leaf]
-                # """
-                def gen():
-                    if maxend is None:
-                        for end in mymatch[leaf]: # repeated elements have ends while leafs have captures
-                            yield substruct.map(partial(recursive_parse, maxend=end), inplace=False)
-                    else:
-                        for i, end in enumerate(mymatch[leaf]):
-                            if end > maxend:
-                                del mymatch[leaf][:i] #delete everything parsed so far
-                                break
-                            yield substruct.map(partial(recursive_parse, maxend=end), inplace=False)
-
-                # return simple list, which is flattened out automatically
-                # (same effect as pseudo structure, however one could process this repetitions further,
-                # e.g. keeping only last repition like it is done in pyparsing for default)
-                return list(gen())
-
-            except KeyError: # base case:
-                # this is always a single entry
-                # we have to check ends as optional fields might get skipped and do not appear at all in ends/captures
-                ends, captures = mymatch[leaf]
-                if not ends:  # nothing matched at all on this entry
-                    return ParserElement.EMPTY
-                elif ends[0] <= maxend or maxend is None:  # some matches within subrange
-                    del ends[0]
-                    return captures.pop(0)
-                else: # matches, but not within this current subrange
-                    return ParserElement.EMPTY
-        return recursive_parse
+        """ function mapping the slot indices of a ShapingPlan template to their values, see L{LeafParser} """
+        return _shaping.LeafParser(mymatch, substructs)
 
     def __iadd__(self, other):
         if isinstance(other, basestring):
             other = ParserElement(regex.escape(other))
-        self.structure += other.structure
-        self.pattern += other.pattern
-        self.name += other.name
-        self._compiled = None
+        self._node = ConcatNode(self._node, other._node)
+        self._reset()
         return self
 
     def __radd__(self, other):
@@ -397,12 +1674,9 @@ class ParserElement(ParserElementType):
         if isinstance(other, basestring):
             other = ParserElement(regex.escape(other))
 
-        self.structure += other.structure
-        self.pattern += "|" + other.pattern
-        self.name += "|" + other.name
-        self.group(pseudo = True,
-                   liftkeys = True,
-                   silent = True)
+        # every (|) adds a pseudo group with lifted keys and a silent regex group, see build_node
+        self._node = AltNode(self._node, other._node)
+        self._reset()
         return self
 
     def __ror__(self, other):
@@ -411,6 +1685,16 @@ class ParserElement(ParserElementType):
         other |= self  #__ior__
         return other
 
+    def __getstate__(self):
+        """ only the grammar tree is pickled, everything else gets rebuild on demand """
+        state = self.__dict__.copy()
+        state['_built'] = None
+        state['_compiled'] = None
+        state['_plan'] = None
+        state['_prefilter'] = None
+        state['_parseAll'] = None
+        return state
+
     def __str__(self):
         # [] are for pprint, () would make more sense
         return "['%s', %s]" % (self.name, str(self.structure))
@@ -421,6 +1705,19 @@ class ParserElement(ParserElementType):
 
 
 
+# compiled result shaping
+# =======================
+# LeafParser and match_table are the hot loop of parsing, _core_cython has compiled versions of both
+# (build by setup.py if Cython is available). They are opt-in via PYPARSING_REGEX_BACKEND=cython,
+# as the compiled module is not built everywhere and should not be picked up unnoticed.
+
+_shaping = sys.modules[__name__]
+if os.environ.get("PYPARSING_REGEX_BACKEND") == "cython":
+    import pyparsing_regex._core_cython as _shaping
+    _shaping.setup(ParseAction, ParserElement.EMPTY)
+
+
+
 
 # copy for non-cyclic imports:
 class StringEnd(ParserElement):
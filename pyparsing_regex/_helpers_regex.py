@@ -1,5 +1,7 @@
 # cython: profile=True
 import regex
+import threading
+from collections import OrderedDict
 from itertools import izip
 
 begins_silently_grouped = regex.compile(r"\(\?:")
@@ -12,12 +14,24 @@ begins_not_silently_grouped = regex.compile(r"\((?!\?)")
 
 singleton_group = regex.compile(r"^\([^()]*\)$")
 
+template_group = regex.compile(r"\\g<([^>]*)>")
+
 def group(pattern):
     return "(%s)" % pattern
 
 def silent_group(pattern):
     return "(?:%s)" % pattern
 
+def skip_whitespace(chars):
+    """ silent pattern skipping all ``chars`` (possessive, as pyparsing never gives back skipped whitespace) """
+    if not chars:
+        return ""
+    return "[%s]*+" % _class_chars(chars)
+
+def _class_chars(chars):
+    """ ``chars`` escaped for a character class """
+    return "".join("\\" + c if c in "\\]^-[" else c for c in chars)
+
 def ensure_grouping(pattern, begins=begins_grouped, newgroup=silent_group):
     """ check whether starting ( corresponds to )
     if not add additional silent parentheses """
@@ -38,4 +52,710 @@ def closing_parentheses_match(data):
             yield openings.pop()
 
 def decodeflags(flags, flags_sorted_bin = (None, "i", "L", "m", "s", "u", "x")):
-    return "".join(d for d, s in izip(flags_sorted_bin, bin(flags)[-1:1:-1]) if s=='1')
\ No newline at end of file
+    return "".join(d for d, s in izip(flags_sorted_bin, bin(flags)[-1:1:-1]) if s=='1')
+
+
+class PatternCache(object):
+    """ process-wide, size-bounded LRU cache of compiled patterns, keyed by (pattern, flags)
+
+    can be used from several threads at once, compilation itself is done outside the lock
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, pattern, flags=0):
+        """ returns compiled ``pattern``, compiling it only if not already cached """
+        key = (pattern, flags)
+        with self._lock:
+            try:
+                compiled = self._cache.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self._cache[key] = compiled # reinsert as most recently used
+                self.hits += 1
+                return compiled
+
+        compiled = regex.compile(pattern, flags)
+
+        with self._lock:
+            # another thread might have been faster, keep the first compiled one
+            compiled = self._cache.setdefault(key, compiled)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+        return compiled
+
+    def info(self):
+        """ statistics as dict """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                        size=len(self._cache), maxsize=self.maxsize)
+
+    def clear(self):
+        """ empties cache and resets statistics """
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = self.evictions = 0
+
+#: shared by all ParserElements
+pattern_cache = PatternCache()
+
+
+def literals_pattern(literals, caseless=False, longest=False):
+    """ regex matching the first of ``literals`` (pyparsing's MatchFirst semantics) as a silent prefix trie
+
+    literals shadowed by an earlier prefix can never match and are dropped,
+    among the remaining ones the first matching literal is always the longest one,
+    which the greedy trie finds. The trie is atomic, i.e. like pyparsing it is not backtracked into.
+    With ``longest=True`` nothing is dropped and simply the longest literal matches (like pyparsing's oneOf).
+    """
+    trie = {}
+    for literal in literals:
+        if caseless:
+            literal = literal.lower()
+        if not literal:
+            continue
+        node = trie
+        for char in literal:
+            if "" in node and not longest:
+                break  # an earlier literal is a prefix
+            node = node.setdefault(char, {})
+        else:
+            node[""] = None
+    if not trie:
+        raise ValueError("at least one non-empty literal is needed")
+    pattern = "(?>%s)" % _trie_pattern(trie)
+    if caseless:
+        pattern = "(?i:%s)" % pattern
+    return pattern
+
+def _trie_pattern(node):
+    chars = []
+    alternatives = []
+    for char in sorted(k for k in node if k):
+        child = node[char]
+        if child.keys() == [""]:
+            chars.append(char)
+        else:
+            alternatives.append(regex.escape(char) + _trie_pattern(child))
+
+    if len(chars) == 1:
+        alternatives.append(regex.escape(chars[0]))
+    elif chars:
+        alternatives.append("[%s]" % _class_chars(chars))
+
+    pattern = "|".join(alternatives)
+    if "" in node:
+        # terminal: longer continuations are tried first (greedy), else the literal ends here
+        if not (chars and len(alternatives) == 1): # a single char or char class needs no group
+            pattern = silent_group(pattern)
+        pattern += "?"
+    elif len(alternatives) > 1:
+        pattern = silent_group(pattern)
+    return pattern
+
+
+# Pattern minimizer
+# =================
+# The pattern is parsed into a small syntax tree (alternatives are lists of sequences of items),
+# simplified and written back. Items are
+#   ("atom", text)                    single char, escape, character class, anchor or global flags
+#   ("group", prefix, alternatives)   prefix "(" or "(?P<name>" for captures, "(?:" for silent groups,
+#                                     anything else like "(?=" or "(?>" is kept as it is
+#   ("quant", item, quantifier)       e.g. "*", "{2,3}?"
+# Everything not understood (verbose mode, recursion, conditionals, fuzzy matching, ...)
+# leaves the pattern unchanged.
+
+class _Unsupported(Exception):
+    pass
+
+_quantifier = regex.compile(r"(?:[*+?]|\{(?:\d+(?:,\d*)?|,\d+)\})[?+]?")
+_inline_flags = regex.compile(r"\(\?([aiLmsuwfbeErV0-9]*(?:-[aiLmsuwfbeErV0-9]*)?)([:)])")
+_long_escape = {"x": 2, "u": 4, "U": 8}
+
+class _PatternParser(object):
+    """ parses a pattern, turning unneeded captures into silent groups on the way
+
+    Captures are treated as structure slots in the order regex numbers them. ``leaves`` tells
+    for each slot whether it is a leaf, i.e. all captures nested in it are unused and get silenced.
+    With ``leaves=None`` all captures are kept, with ``silence_all`` none.
+    """
+
+    def __init__(self, pattern, leaves=None, silence_all=False):
+        self.pattern = pattern
+        self.pos = 0
+        self.leaves = leaves
+        self.in_leaf = silence_all
+        self.slots = 0
+        self.silenced = 0
+        self.backreferences = False
+
+    def parse(self):
+        alternatives = self.alternatives()
+        if self.pos != len(self.pattern):
+            raise _Unsupported("unbalanced )")
+        return alternatives
+
+    def alternatives(self):
+        pattern = self.pattern
+        alternatives = [[]]
+        while self.pos < len(pattern):
+            char = pattern[self.pos]
+            if char == ")":
+                break
+            elif char == "|":
+                self.pos += 1
+                alternatives.append([])
+                continue
+            item = self.item()
+            if item is None:
+                continue
+            quantifier = _quantifier.match(pattern, self.pos)
+            if quantifier:
+                self.pos = quantifier.end()
+                item = ("quant", item, quantifier.group())
+            elif self.pos < len(pattern) and pattern[self.pos] in "*+?{":
+                raise _Unsupported("unknown quantifier")
+            alternatives[-1].append(item)
+        return alternatives
+
+    def item(self):
+        pattern = self.pattern
+        start = self.pos
+        char = pattern[start]
+        if char == "(":
+            return self.group()
+        elif char == "[":
+            self.pos = self.class_end(start)
+        elif char == "\\":
+            self.pos = self.escape_end(start)
+        else:
+            self.pos += 1
+        return ("atom", pattern[start:self.pos])
+
+    def class_end(self, start):
+        pattern = self.pattern
+        i = start + 1
+        if pattern.startswith("^", i):
+            i += 1
+        if pattern.startswith("]", i):
+            i += 1
+        while i < len(pattern):
+            if pattern[i] == "\\":
+                i += 2
+            elif pattern.startswith("[:", i):
+                i = pattern.find(":]", i + 2) + 2
+                if i == 1:
+                    raise _Unsupported("unterminated POSIX class")
+            elif pattern[i] == "]":
+                return i + 1
+            else:
+                i += 1
+        raise _Unsupported("unterminated character class")
+
+    def escape_end(self, start):
+        pattern = self.pattern
+        i = start + 1
+        if i >= len(pattern):
+            raise _Unsupported("trailing backslash")
+        char = pattern[i]
+        if char in _long_escape:
+            if pattern.startswith("{", i + 1):
+                return pattern.index("}", i) + 1
+            return i + 1 + _long_escape[char]
+        if char in "NpP":
+            if pattern.startswith("{", i + 1):
+                return pattern.index("}", i) + 1
+            return i + 2
+        if char == "g":
+            self.backreferences = True
+            return pattern.index(">", i) + 1
+        if char.isdigit():
+            digits = regex.match(r"[0-7]{3}|0[0-7]{0,2}|\d{1,2}", pattern[i:]).group()
+            if not (char == "0" or len(digits) == 3):
+                self.backreferences = True
+            return i + len(digits)
+        return i + 1
+
+    def group(self):
+        pattern = self.pattern
+        start = self.pos
+        if not pattern.startswith("(?", start):
+            self.pos += 1
+            return self.capture("(")
+
+        rest = pattern[start + 2:start + 4]
+        if rest.startswith(":"):
+            prefix = "(?:"
+        elif rest.startswith("P="):
+            self.backreferences = True
+            self.pos = pattern.index(")", start) + 1
+            return ("atom", pattern[start:self.pos])
+        elif rest.startswith("P<") or rest.startswith("<") and rest[1:] not in ("=", "!"):
+            self.pos = pattern.index(">", start) + 1
+            return self.capture(pattern[start:self.pos])
+        elif rest[:1] in ("=", "!", ">") or rest in ("<=", "<!"):
+            prefix = "(?%s" % (rest if rest[:1] == "<" else rest[:1])
+        elif rest.startswith("#"):
+            self.pos = pattern.index(")", start) + 1
+            return None
+        else:
+            flags = _inline_flags.match(pattern, start)
+            if flags is None or "x" in flags.group(1) or "V1" in flags.group(1):
+                raise _Unsupported(pattern[start:start + 4])
+            if flags.group(2) == ")":
+                self.pos = flags.end()
+                return ("atom", flags.group())
+            prefix = flags.group()
+        self.pos = start + len(prefix)
+        return ("group", prefix, self.body())
+
+    def capture(self, prefix):
+        in_leaf = self.in_leaf
+        if self.leaves is None:
+            pass
+        elif in_leaf:
+            prefix = "(?:"
+            self.silenced += 1
+        else:
+            slot = self.slots
+            self.slots += 1
+            self.in_leaf = slot < len(self.leaves) and self.leaves[slot]
+        body = self.body()
+        self.in_leaf = in_leaf
+        return ("group", prefix, body)
+
+    def body(self):
+        body = self.alternatives()
+        if not self.pattern.startswith(")", self.pos):
+            raise _Unsupported("missing )")
+        self.pos += 1
+        return body
+
+
+class _Simplifier(object):
+    """ removes redundant silent groups and quantifiers, merges single char alternatives and repeated atoms """
+
+    def __init__(self):
+        self.groups = 0
+        self.quantifiers = 0
+        self.merged = 0
+
+    def alternatives(self, alternatives):
+        branches = []
+        for sequence in alternatives:
+            sequence = self.sequence(sequence)
+            if len(sequence) == 1 and sequence[0][0] == "group" and sequence[0][1] == "(?:":
+                # a|(?:b|c)  ->  a|b|c
+                branches.extend(sequence[0][2])
+                self.groups += 1
+            else:
+                branches.append(sequence)
+
+        if len(branches) > 1 and all(len(s) == 1 and _class_content(s[0]) is not None for s in branches):
+            # a|[bc]|\d  ->  [abc\d]
+            self.merged += len(branches) - 1
+            branches = [[("atom", "[%s]" % "".join(_class_content(s[0]) for s in branches))]]
+        return branches
+
+    def sequence(self, sequence):
+        out = []
+        for item in sequence:
+            for item in self.item(item):
+                merged = out and _merge_repeated(out[-1], item)
+                if merged:
+                    out[-1] = merged
+                    self.merged += 1
+                else:
+                    out.append(item)
+        return out
+
+    def item(self, item):
+        """ list of items replacing ``item`` """
+        kind = item[0]
+        if kind == "atom":
+            return [item]
+
+        if kind == "group":
+            body = self.alternatives(item[2])
+            if item[1] == "(?:" and len(body) == 1:
+                # a(?:bc)d  ->  abcd
+                self.groups += 1
+                return body[0]
+            return [("group", item[1], body)]
+
+        inner, quantifier = item[1], item[2]
+        if quantifier in ("{1}", "{1}?", "{1,1}", "{1,1}?"):
+            self.quantifiers += 1
+            return self.item(inner)
+        if inner[0] == "group":
+            body = self.alternatives(inner[2])
+            inner = ("group", inner[1], body)
+            if inner[1] == "(?:" and len(body) == 1 and len(body[0]) == 1:
+                single = body[0][0]
+                if single[0] == "group" and single[1] != "(?:" or _is_char(single):
+                    # (?:a)*  ->  a*
+                    self.groups += 1
+                    inner = single
+        canonical = _quantifier_text(*_quantifier_range(quantifier))
+        if canonical != quantifier:
+            self.quantifiers += 1
+        return [("quant", inner, canonical)]
+
+
+def _class_content(item):
+    """ ``item`` as part of a character class, None if it does not match exactly one char """
+    if item[0] != "atom":
+        return None
+    text = item[1]
+    if len(text) == 1:
+        return None if text in ".^$" else _class_chars(text)
+    if text[0] == "\\":
+        char = text[1]
+        if len(text) == 2:
+            if char in "dDwWsSntrfv" or not char.isalnum():
+                return text
+            return None
+        return text if char in "xuUNpP" else None
+    if text[0] == "[" and text[1] not in "^]-" and (not text.endswith("-]") or text.endswith("\\-]")):
+        inner = text[1:-1]
+        if "[" not in inner and not any(op in inner for op in ("--", "&&", "||", "~~")):
+            return inner
+    return None
+
+def _is_char(item):
+    return _class_content(item) is not None or item == ("atom", ".")
+
+def _quantifier_range(quantifier):
+    """ ``(min, max, suffix)`` of ``quantifier``, max is None if unbounded """
+    suffix = ""
+    if quantifier[-1] in "?+" and len(quantifier) > 1:
+        quantifier, suffix = quantifier[:-1], quantifier[-1]
+    if quantifier == "*":
+        return 0, None, suffix
+    if quantifier == "+":
+        return 1, None, suffix
+    if quantifier == "?":
+        return 0, 1, suffix
+    bounds = quantifier[1:-1].split(",")
+    low = int(bounds[0] or 0)
+    if len(bounds) == 1:
+        return low, low, suffix
+    return low, int(bounds[1]) if bounds[1] else None, suffix
+
+def _quantifier_text(low, high, suffix=""):
+    if high is None:
+        text = {0: "*", 1: "+"}.get(low, "{%s,}" % low)
+    elif low == high:
+        text = "{%s}" % low
+    else:
+        text = "?" if (low, high) == (0, 1) else "{%s,%s}" % (low, high)
+    return text + suffix
+
+def _merge_repeated(left, right):
+    """ ``left + right`` as single quantified item if both repeat the same char greedily, e.g. a a* -> a+
+
+    only done if this does not make the pattern longer """
+    if left[0] == "atom" and right[0] == "atom":
+        return None  # at least one must be quantified
+    ranges = []
+    for item in (left, right):
+        if item[0] == "atom":
+            ranges.append((item, 1, 1))
+        elif item[0] == "quant":
+            low, high, suffix = _quantifier_range(item[2])
+            if suffix:
+                return None
+            ranges.append((item[1], low, high))
+        else:
+            return None
+    (atom, low1, high1), (atom2, low2, high2) = ranges
+    if atom != atom2 or not _is_char(atom):
+        return None
+    high = None if high1 is None or high2 is None else high1 + high2
+    merged = ("quant", atom, _quantifier_text(low1 + low2, high))
+    if len(_write_item(merged)) > len(_write_item(left) + _write_item(right)):
+        return None  # e.g. a a? is not worth a{1,2}
+    return merged
+
+def _write(alternatives):
+    return "|".join("".join(_write_item(item) for item in sequence) for sequence in alternatives)
+
+def _write_item(item):
+    if item[0] == "atom":
+        return item[1]
+    if item[0] == "group":
+        return "%s%s)" % (item[1], _write(item[2]))
+    return _write_item(item[1]) + item[2]
+
+
+def minimize(pattern, leaves=None):
+    """ equivalent ``pattern`` with fewer groups, together with statistics what was removed
+
+    ``leaves`` lists for every capture (i.e. Structure slot) whether it is a leaf, captures nested within leaves
+    are not used by any slot and become silent (e.g. groups of a user's ``Regex``), so that the remaining captures
+    are numbered exactly like the slots. If the pattern contains backreferences, all captures are kept.
+
+    Redundant silent groups are dropped or flattened, ``{1}`` quantifiers dropped,
+    alternatives of single chars merged to one character class and repetitions of the same char merged (``aa*`` to ``a+``).
+    The statistics are a dict with the number of ``captures`` made silent, silent ``groups`` removed,
+    simplified ``quantifiers`` and ``merged`` items.
+    """
+    minimized, stats, tree = minimize_tree(pattern, leaves)
+    return minimized, stats
+
+def minimize_tree(pattern, leaves=None):
+    """ like ``minimize``, additionally returning the parsed minimized pattern (None if it could not be parsed)
+
+    The tree can be passed on to ``scan_prefilter`` and ``risky_constructs``, so that the pattern is parsed only once.
+    """
+    stats = dict(captures=0, groups=0, quantifiers=0, merged=0)
+    try:
+        parser = _PatternParser(pattern, leaves)
+        tree = parser.parse()
+        if parser.backreferences and parser.silenced:
+            parser = _PatternParser(pattern)
+            tree = parser.parse()
+        elif leaves is not None and parser.slots != len(leaves):
+            return pattern, stats, None  # captures do not correspond to slots, better keep everything as it is
+    except (_Unsupported, ValueError, AttributeError):
+        return pattern, stats, None
+
+    simplifier = _Simplifier()
+    tree = simplifier.alternatives(tree)
+    stats.update(captures=parser.silenced, groups=simplifier.groups,
+                 quantifiers=simplifier.quantifiers, merged=simplifier.merged)
+    return _write(tree), stats, tree
+
+def _parsed(pattern):
+    """ parse tree of ``pattern``, None if not supported """
+    try:
+        return _PatternParser(pattern).parse()
+    except (_Unsupported, ValueError, AttributeError):
+        return None
+
+def silence_captures(pattern):
+    """ ``pattern`` with all captures turned into silent groups """
+    try:
+        return _write(_PatternParser(pattern, (), silence_all=True).parse())
+    except (_Unsupported, ValueError, AttributeError):
+        return begins_not_silently_grouped.sub("(?:", pattern)
+
+
+# Scan prefilter
+# ==============
+
+_zero_width = frozenset(["^", "$", r"\b", r"\B", r"\A", r"\Z", r"\G", r"\K"])
+_lookarounds = frozenset(["(?=", "(?!", "(?<=", "(?<!"])
+_plain_class = regex.compile(r"\[((?:\\[^0-9A-Za-z]|[^\\\]\-])+)\]")
+
+def scan_prefilter(pattern, tree=None):
+    """ ``(search, required)`` helping non-overlapping scans with ``pattern`` to skip impossible positions
+
+    ``search`` is an equivalent pattern to search with, or None. Leading whitespace skipped before ``\\K``
+    forces the regex engine to try every position, without it the engine can jump straight to possible
+    first characters (or literal prefixes) of the remaining pattern. This is equivalent as long as the
+    remaining pattern cannot start with whitespace itself (and cannot match empty).
+
+    ``required`` is the longest literal every match must contain, or "" if there is none.
+    Inputs not containing it cannot match at all.
+    ``tree`` is the already parsed ``pattern``, if available (see ``minimize_tree``).
+    """
+    flags = [f.group(1) for f in _inline_flags.finditer(pattern)]
+    if any("i" in f for f in flags):
+        return None, ""
+    if tree is None:
+        tree = _parsed(pattern)
+    if tree is None or len(tree) != 1:
+        return None, ""
+    sequence = tree[0]
+
+    search = None
+    skip = len(sequence) > 2 and sequence[1] == ("atom", r"\K") and _skipped_chars(sequence[0])
+    if skip:
+        rest = sequence[2:]
+        while rest and rest[0] == sequence[0]:
+            rest = rest[1:]  # the same skip again has nothing left to skip
+        first = _first([rest])
+        if first is not None and first[0] and not first[1]:
+            first_class = regex.compile("[%s]" % "".join(first[0]))
+            if not any(first_class.match(char) for char in skip):
+                search = _write([rest])
+    return search, _required(sequence)
+
+def _skipped_chars(item):
+    """ chars skipped by ``item`` if it is a possessive whitespace skip like build by ``skip_whitespace`` """
+    if item[0] != "quant" or item[2] != "*+" or item[1][0] != "atom":
+        return None
+    plain = _plain_class.match(item[1][1])
+    if plain is None or plain.end() != len(item[1][1]) or plain.group(1)[0] == "^":
+        return None
+    return regex.sub(r"\\(.)", r"\1", plain.group(1))
+
+def _first(alternatives):
+    """ ``(class contents, nullable)`` of the chars a match of ``alternatives`` can start with, None if unknown """
+    contents = []
+    nullable = False
+    for sequence in alternatives:
+        for item in sequence:
+            first = _first_item(item)
+            if first is None:
+                return None
+            contents.extend(first[0])
+            if not first[1]:
+                break
+        else:
+            nullable = True
+    return contents, nullable
+
+def _first_item(item):
+    kind = item[0]
+    if kind == "atom":
+        content = _class_content(item)
+        if content is not None:
+            return [content], False
+        if item[1] in _zero_width:
+            return [], True
+        return None  # any char, negated classes, backreferences, global flags
+    if kind == "group":
+        prefix = item[1]
+        if prefix in _lookarounds:
+            return [], True
+        if prefix in ("(", "(?:", "(?>") or prefix.startswith("(?P<") or prefix.startswith("(?<"):
+            return _first(item[2])
+        return None  # scoped flags
+    first = _first_item(item[1])
+    if first is None:
+        return None
+    return first[0], first[1] or _quantifier_range(item[2])[0] == 0
+
+def _literal(item):
+    """ the text ``item`` matches if it is a plain literal, else None """
+    kind = item[0]
+    if kind == "atom":
+        text = item[1]
+        if len(text) == 1:
+            return None if text in ".^$" else text
+        if len(text) == 2 and text[0] == "\\" and not text[1].isalnum():
+            return text[1]
+        return None
+    if kind == "group" and item[1] in ("(", "(?:", "(?>") and len(item[2]) == 1:
+        literals = [_literal(i) for i in item[2][0]]
+        if None not in literals:
+            return "".join(literals)
+    return None
+
+def _required(sequence):
+    """ longest literal every match of ``sequence`` contains """
+    runs = [""]
+    for item in sequence:
+        literal = _literal(item)
+        if literal is not None:
+            runs[-1] += literal
+        elif item[0] == "atom" and item[1] in _zero_width or item[0] == "group" and item[1] in _lookarounds:
+            pass  # does not consume anything, the run continues
+        else:
+            if item[0] == "quant" and _quantifier_range(item[2])[0] > 0:
+                item = item[1]
+            if item[0] == "group" and item[1] in ("(", "(?:", "(?>") and len(item[2]) == 1:
+                runs.append(_required(item[2][0]))
+            runs.append("")
+    return max(runs, key=len)
+
+
+# Backtracking risks
+# ==================
+
+_sample_chars = [chr(i) for i in range(256)]
+#: groups which are never backtracked into
+_opaque = _lookarounds | frozenset(["(?>"])
+
+def risky_constructs(pattern, tree=None):
+    """ parts of ``pattern`` which may backtrack catastrophically (heuristic)
+
+    These are unbounded, non-possessive repetitions whose iterations can split the same text in several ways,
+    i.e. whose body contains a further loop or alternatives starting alike, and may end with what it starts with,
+    like ``(a+)+`` or ``(a|aa)+``. ``tree`` is the already parsed ``pattern``, if available.
+    """
+    if tree is None:
+        tree = _parsed(pattern)
+    if tree is None:
+        return []
+    found = []
+    _find_risky(tree, found)
+    return found
+
+def _find_risky(alternatives, found):
+    for sequence in alternatives:
+        for item in sequence:
+            if item[0] == "group":
+                _find_risky(item[2], found)
+            elif item[0] == "quant":
+                inner = item[1]
+                body = inner[2] if inner[0] == "group" and inner[1] not in _opaque else [[inner]]
+                low, high, suffix = _quantifier_range(item[2])
+                if high is None and suffix != "+" and _ambiguous(body):
+                    found.append(_write_item(item))
+                else:
+                    _find_risky(body, found)
+
+def _ambiguous(body):
+    if not (_has_loop(body) or _has_overlapping_branches(body)):
+        return False
+    first = _first(body)
+    last = _first(_reversed(body))
+    return first is None or last is None or _overlap(first[0], last[0])
+
+def _has_loop(alternatives):
+    for sequence in alternatives:
+        for item in sequence:
+            if item[0] == "quant":
+                low, high, suffix = _quantifier_range(item[2])
+                if high is None and suffix != "+" or _has_loop([[item[1]]]):
+                    return True
+            elif item[0] == "group" and item[1] not in _opaque and _has_loop(item[2]):
+                return True
+    return False
+
+def _has_overlapping_branches(alternatives):
+    if len(alternatives) > 1:
+        firsts = [_first([sequence]) for sequence in alternatives]
+        if None in firsts:
+            return True
+        for i, first in enumerate(firsts):
+            for other in firsts[i + 1:]:
+                if _overlap(first[0], other[0]):
+                    return True
+    for sequence in alternatives:
+        for item in sequence:
+            if item[0] == "quant":
+                item = item[1]
+            if item[0] == "group" and item[1] not in _opaque and _has_overlapping_branches(item[2]):
+                return True
+    return False
+
+def _reversed(alternatives):
+    """ ``alternatives`` read backwards, as far as needed for ``_first`` """
+    return [[_reversed_item(item) for item in reversed(sequence)] for sequence in alternatives]
+
+def _reversed_item(item):
+    if item[0] == "group":
+        return ("group", item[1], _reversed(item[2]))
+    if item[0] == "quant":
+        return ("quant", _reversed_item(item[1]), item[2])
+    return item
+
+def _overlap(contents, other):
+    """ whether the character classes given by their ``contents`` have common chars (tested on the first 256) """
+    if not contents or not other:
+        return False
+    first = regex.compile("[%s]" % "".join(contents))
+    second = regex.compile("[%s]" % "".join(other))
+    return any(first.match(char) and second.match(char) for char in _sample_chars)
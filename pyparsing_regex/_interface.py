@@ -1,26 +1,21 @@
 # Pyparsing-like Interface
 # ========================
-try:
-    import pyximport; pyximport.install()
-    from pyparsing_regex._core_cython import ParserElement, Structure
-    print "using cython"
-except ImportError as e:
-    print "NOT using cython", e
-    from pyparsing_regex._core import ParserElement, Structure
-
+from pyparsing_regex._core import ParserElement, Structure, SuppressNode, drop_leading_whitespace, \
+    ParseTimeoutError, BacktrackingWarning, CarryExceededError
 import pyparsing_regex._helpers_regex as hre
+from pyparsing_regex._helpers_regex import pattern_cache
+from pyparsing_regex._cache import cachedGrammar
+from pyparsing_regex._profile import profiling, enable as enableProfiling, disable as disableProfiling, \
+    stats as profileStats, reset as resetProfileStats
 import regex
 import __builtin__
 from copy import copy
 
-import cPickle
-
-def deepcopy(o):
-    """fast deepcopy alternative"""
-    return cPickle.loads(cPickle.dumps(o, -1))
-
 # emulate generic methods from pyparsing itself:
-from pyparsing import srange
+def srange(s):
+    """ pyparsing's srange, pyparsing is only imported when this is first used """
+    from pyparsing import srange
+    return srange(s)
 
 
 
@@ -28,6 +23,8 @@ from pyparsing import srange
 class Literal(ParserElement):
     def __init__(self, str):
         super(Literal, self).__init__(regex.escape(str))
+        # remembering the literal lets alternatives of Literals be compiled into a single prefix trie
+        self._node = self._node._replace(literal=str)
 
 class Regex(ParserElement):
     def __init__(self, pattern, flags=0):
@@ -49,6 +46,7 @@ class Word(ParserElement):
             if bodyChars:
                 bodyChars = bodyChars + "--" + excludeChars
 
+        # possessive, as like in pyparsing a Word never gives back characters
         if exact == 1 or max == 1:
             pattern = r"[%s]{1}"%(initChars)
         elif exact > 1:
@@ -58,26 +56,27 @@ class Word(ParserElement):
                 pattern = r"[%s]{%s}"%(initChars, exact)
         elif max > 1:
             if bodyChars:
-                pattern = r"[%s]{1}[%s]{%s,%s}"%(initChars, bodyChars, __builtin__.max(min-1,0), max-1)
+                pattern = r"[%s]{1}[%s]{%s,%s}+"%(initChars, bodyChars, __builtin__.max(min-1,0), max-1)
             else:
-                pattern = r"[%s]{%s,%s}"%(initChars, min, max)
+                pattern = r"[%s]{%s,%s}+"%(initChars, min, max)
         else: # arbitrary upper bound
             if bodyChars:
-                pattern = r"[%s]{1}[%s]{%s,}"%(initChars, bodyChars, __builtin__.max(min-1,0))
+                pattern = r"[%s]{1}[%s]{%s,}+"%(initChars, bodyChars, __builtin__.max(min-1,0))
             else:
-                pattern = r"[%s]{%s,}"%(initChars, min)
+                pattern = r"[%s]{%s,}+"%(initChars, min)
         super(Word, self).__init__(pattern)
 
 class CharsNotIn(Word):
     def __init__(self, notChars, min=1, max=0, exact=0):
         super(CharsNotIn, self).__init__("^%s" % notChars, min=min, max=max, exact=exact)
+        self.leaveWhitespace() # like in pyparsing, whitespace may be part of the match
 
 
 def _silent_pattern(expr):
     if isinstance(expr, basestring):
         return regex.escape(expr)
     else:
-        return hre.begins_not_silently_grouped.sub("(?:", expr.pattern)
+        return hre.silence_captures(expr.pattern)
 
 class SkipTo(ParserElement):
     def __init__(self, expr, include_=False):
@@ -89,7 +88,15 @@ class SkipTo(ParserElement):
         argument is used to define grammars (typically quoted strings and comments) that
         might contain false matches.
         """
-        pattern = r"(?:.(?!%s))*." % _silent_pattern(expr)
+        if not isinstance(expr, basestring):
+            # like pyparsing, expr is tested exactly at every position, i.e. without its leading skip
+            # (only alternatives skip whitespace themselves), whitespace between its tokens is skipped as usual
+            expr = copy(expr)
+            expr._node = drop_leading_whitespace(expr._node, None)
+            expr._reset()
+        # possessive, as like in pyparsing the skipped text always ends right before the first match of expr
+        # (backtracking could only yield shorter skips not followed by expr, and takes quadratic time)
+        pattern = r"(?:(?s:.)(?!%s))*+(?s:.)" % _silent_pattern(expr)
         if include_:
             pattern += _silent_pattern(expr)
         super(SkipTo, self).__init__(pattern)
@@ -102,6 +109,7 @@ class FollowedBy(ParserElement):
         verifies that the specified parse expression matches at the current
         position.  C{FollowedBy} always returns a null token list."""
         pattern = r"(?=%s)" % _silent_pattern(expr) # standard lookahead
+        # like in pyparsing, whitespace before the lookahead is skipped (and part of the match)
         super(FollowedBy, self).__init__(pattern, silent=True)
 
 class Combine(ParserElement):
@@ -109,18 +117,27 @@ class Combine(ParserElement):
         """Converter to concatenate all matching tokens to a single string.
         By default, the matching patterns must also be contiguous in the input string;
         this can be disabled by specifying C{'adjacent=False'} in the constructor."""
+        if not isinstance(expr, basestring):
+            expr = copy(expr).leaveWhitespace() # only the Combine itself skips whitespace
         super(Combine, self).__init__(_silent_pattern(expr))
 
 
 class Suppress(ParserElement):
     def __init__(self, expr):
-        super(Suppress, self).__init__(_silent_pattern(expr), silent=True)
+        if isinstance(expr, basestring):
+            expr = Literal(expr)
+        super(Suppress, self).__init__("", silent=True)
+        # like expr.suppress() without changing expr: the skips of expr stay part of the grammar tree,
+        # so that its leading whitespace is skipped before the start of the match and leaveWhitespace applies
+        self._node = SuppressNode(expr._node)
+        self._reset()
 
 
 class StringStart(ParserElement):
     def __init__(self):
-        """matches beginning of the text"""
-        super(StringStart, self).__init__(r"^")
+        """matches beginning of the text, like in pyparsing also after leading whitespace (no token)"""
+        super(StringStart, self).__init__(r"(?<=^[%s]*)" % hre._class_chars(ParserElement.DEFAULT_WHITE_CHARS),
+                                          silent=True)
 
 class StringEnd(ParserElement):
     def __init__(self):
@@ -129,13 +146,17 @@ class StringEnd(ParserElement):
 
 class LineStart(Regex):
     def __init__(self):
-        """matches beginning of a line (lines delimited by \n characters)"""
-        super(LineStart, self).__init__(r"^", regex.MULTILINE)
+        """matches beginning of a line (lines delimited by \n characters)
+
+        like in pyparsing, whitespace is skipped before, i.e. lines starting with whitespace do not match (no token)
+        """
+        ParserElement.__init__(self, r"(?m:^)", silent=True)
 
 class LineEnd(Regex):
     def __init__(self):
-        """matches the end of a line"""
-        super(LineEnd, self).__init__(r"$", regex.MULTILINE)
+        """matches the end of a line, like in pyparsing the newline is consumed and returned"""
+        super(LineEnd, self).__init__(r"\n|\Z")
+        self.setWhitespaceChars(ParserElement.DEFAULT_WHITE_CHARS.replace("\n", ""))
 
 
 # For the rest, functions are much easier than classes, so we keep it with them
@@ -167,6 +188,32 @@ def MatchFirst(iterable):
     except StopIteration:  # only one element
         return first
 
+def oneOf(strs, caseless=False):
+    """Helper to quickly define a set of alternative Literals, given as list or whitespace separated string.
+    Like in pyparsing, the longest matching literal wins, independent of the given order.
+
+    All literals are matched by a single prefix trie with a single result, which stays fast also for
+    thousands of keywords. (Plain alternatives of Literals, e.g. by MatchFirst, are compiled the same way,
+    however there the first matching literal wins.)
+    """
+    if isinstance(strs, basestring):
+        strs = strs.split()
+    element = ParserElement(hre.literals_pattern(strs, caseless=caseless, longest=True))
+    if caseless: # like pyparsing, the literal is returned as declared and not as matched
+        element.setParseAction(_DeclaredCase(strs))
+    return element
+
+
+class _DeclaredCase(object):
+    """ parse action of caseless oneOf, mapping the matched text to the first literal declared with that text """
+    def __init__(self, strs):
+        self.declared = {}
+        for s in strs:
+            self.declared.setdefault(s.lower(), s)
+
+    def __call__(self, matched):
+        return self.declared[matched.lower()]
+
 #Or __xor__ and Each __and__ are missing - takes more time to implement
 
 def Optional(expr, default=None):
@@ -174,17 +221,17 @@ def Optional(expr, default=None):
         Structure.EMPTY_DEFAULT = default
     cp = copy(expr)
     cp.__class__ = ParserElement
-    cp.pattern = r"%s?" % hre.ensure_grouping(cp.pattern)
+    cp.optional()
     return cp
 
 def Group(expr):
-    g = deepcopy(expr)
+    g = copy(expr)
     g.__class__ = ParserElement
     g.group(silent=True)
     return g
 
 def GroupLiftKeys(expr):
-    g = deepcopy(expr)
+    g = copy(expr)
     g.__class__ = ParserElement
     g.group(silent=True, liftkeys=True)
     return g
@@ -196,7 +243,7 @@ def ZeroOrMore(expr):
     return Repeat(expr)
 
 def Repeat(expr, min=0, max=None):
-    expr = deepcopy(expr)
+    expr = copy(expr)
     expr.__class__ = ParserElement
     expr.repeat(min=min, max=max)
     return expr
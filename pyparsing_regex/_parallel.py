@@ -0,0 +1,48 @@
+""" worker side of ParserElement.parseMany / searchMany
+
+Kept in an own module so that multiprocessing only gets imported when actually used.
+Workers only know the pattern and the flat slot table of a grammar, results get shaped by the calling process.
+"""
+import multiprocessing
+
+import pyparsing_regex._helpers_regex as hre
+from pyparsing_regex._core import ParserElement
+
+# per worker state, set by _init_worker
+_compiled = None
+_table = None
+
+
+def _init_worker(pattern, table):
+    global _compiled, _table
+    _compiled = hre.pattern_cache.get(pattern)
+    _table = table
+
+
+def parse_record(item):
+    """ returns ``(index, (parse_end, match table))`` or ``(index, None)`` if nothing matched """
+    index, record = item
+    match = _compiled.match(record)
+    if match is None:
+        return index, None
+    return index, (match.end(), ParserElement._matchTable(match, _table))
+
+
+def search_record(item):
+    """ returns ``(index, [(parse_end, match table), ...])`` for all non-empty matches """
+    index, record = item
+    return index, [(match.end(), ParserElement._matchTable(match, _table))
+                   for match in _compiled.finditer(record) if match.end() > match.start()]
+
+
+def map_records(func, pattern, table, iterable, workers=None, chunksize=64, ordered=True):
+    """ generates ``func((index, record))`` for all records, computed by a pool of ``workers`` processes """
+    pool = multiprocessing.Pool(workers, _init_worker, (pattern, table))
+    try:
+        mapper = pool.imap if ordered else pool.imap_unordered
+        for result in mapper(func, enumerate(iterable), chunksize):
+            yield result
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
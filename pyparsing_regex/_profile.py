@@ -0,0 +1,89 @@
+""" opt-in instrumentation of ParserElements
+
+Counts calls and cumulative time per phase and per element name (see ``ParserElement.setName``).
+Phases are ``plan`` (building the result-shaping plan), ``minimize`` (simplifying the pattern, see
+``hre.minimize``), ``compile`` (regex compilation), ``match`` (running the regex) and ``shape`` (building
+the result out of a match).
+
+While disabled, the hot path only checks the module level flag ``enabled``.
+"""
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+
+enabled = False
+
+_stats = {} # {(name, phase): [calls, seconds]}
+_lock = threading.Lock()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+@contextmanager
+def profiling(reset_stats=True):
+    """ records stats for everything parsed within the with-block """
+    global enabled
+    if reset_stats:
+        reset()
+    previous = enabled
+    enabled = True
+    try:
+        yield
+    finally:
+        enabled = previous
+
+
+def stats():
+    """ ``{name: {phase: {'calls': int, 'time': seconds}}}`` of everything recorded so far """
+    with _lock:
+        items = [(key, list(value)) for key, value in _stats.iteritems()]
+    result = {}
+    for (name, phase), (calls, seconds) in items:
+        result.setdefault(name, {})[phase] = dict(calls=calls, time=seconds)
+    return result
+
+
+def record(name, phase, seconds, calls=1):
+    with _lock:
+        entry = _stats.setdefault((name, phase), [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+
+def call(name, phase, func, *args, **kwargs):
+    """ ``func(*args, **kwargs)``, recorded as ``phase`` of ``name`` """
+    start = default_timer()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        record(name, phase, default_timer() - start)
+
+
+def iterate(name, phase, iterator):
+    """ generates from ``iterator``, every step yielding an item recorded as a call of ``phase`` of ``name``
+
+    the time of the final step, which finds no further item, is added without counting a call
+    """
+    iterator = iter(iterator)
+    while True:
+        start = default_timer()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record(name, phase, default_timer() - start, calls=0)
+            return
+        record(name, phase, default_timer() - start)
+        yield item
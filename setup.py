@@ -4,12 +4,18 @@ __author__ = 'Stephan Sahm'
 
 import os
 import shutil
-from setuptools import setup
+from setuptools import setup, Extension
 from distutils.command.clean import clean as Clean
 
-# for compatibility with easy setup.py and pip install, we choose to use pyximport
-# and hence do not compile cython extensions by setup.py:
-# from Cython.Build import cythonize
+# the compiled result shaping (pyparsing_regex._core_cython) is optional,
+# without Cython or a working compiler the pure Python version within pyparsing_regex._core is used
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize([Extension("pyparsing_regex._core_cython", ["pyparsing_regex/_core_cython.pyx"],
+                                       optional=True)])
 
 
 class CleanCmd(Clean):
@@ -48,7 +54,7 @@ setup(
     license='closed source',
     packages=['pyparsing_regex'],
     zip_safe=False,
-    # ext_modules = cythonize("pyparsing_regex/_core_cython.pyx"),
+    ext_modules=ext_modules,
     install_requires=["regex>=2016.1.10",
                       "pyparsing>=2.0.3",
                       "schlichtanders>=0.1.0"], # "schlichtanders @ git+https://github.com/schlichtanders/schlichtanders.git", # this is the future, however not yet implemented in setuptools
@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" grammars and reference comparisons shared by the test modules (``import conftest``) """
+from __future__ import division
+
+from pyparsing_regex import *
+
+nums = "0123456789"
+
+
+def grammars():
+    """ fresh (not yet compiled) grammars together with their input, covering repetitions (also nested),
+    optional leaves, names, SkipTo and parse actions """
+    w = Word("abc", exact=2)
+    ww = GroupLiftKeys(w("a") + w("b"))("ww")
+    ww2 = GroupLiftKeys(ww + ww)("ww2")
+    yield Repeat(ww, 2, 4), "abcbbcccabccbcca"
+    yield Repeat(ww2, 2, 4), "abcbbcccabccbcca"
+    yield Group(Word(nums)("n") + Literal(",") + Word(nums)("m"))("g"), "123,456"
+    yield Literal("<") + SkipTo(Literal(">"))("inner") + Literal(">"), "<some skipped text>"
+    yield Word(nums)("int").setParseAction(int) + Optional(Literal(".") + Word(nums)("frac")), "3.1415"
+    yield OneOrMore(Group(Word("xyz")("w") + Optional(Literal("!")("bang")) + Suppress(Literal(";")))), "xx;y!;zzz;"
+    yield OneOrMore(Group(Word(nums)("n").setParseAction(int) + Literal(","))
+                    .setParseAction(lambda tokens: tokens)), "1,22,333,"
+    yield (ZeroOrMore(Group(Literal("[") + ZeroOrMore(Word("01")("y") + Literal(",")) + Literal("]"))),
+           "[01, 1,] [] [0,]")
+
+
+def results(grammar, text, repeat=1):
+    """ parseString, searchString and scanString results as str, to be compared with a reference """
+    return [str(grammar.parseString(text)),
+            str(grammar.searchString(("--" + text) * repeat)),
+            str([tokens for tokens, start, end in grammar.scanString("--" + text)])]
+
+
+def scanned(scan):
+    """ ``(tokens, start, end)`` of a scan with the tokens as str """
+    return [(str(tokens), start, end) for tokens, start, end in scan]
+
+
+def flat(tokens):
+    """ list of all token strings, independent of the nesting """
+    if isinstance(tokens, basestring):
+        return [tokens]
+    return [token for nested in tokens if nested is not None for token in flat(nested)]
+
+
+def assert_scan_like_pyparsing(build, text, **kwargs):
+    """ ``build(lib)`` has to scan ``text`` with pyparsing_regex (``lib=pr``) like with pyparsing (``lib=pp``) """
+    import pyparsing as pp # only needed for these comparisons
+    import pyparsing_regex as pr
+    mine, theirs = [[(flat(tokens), start, end) for tokens, start, end in build(lib).scanString(text, **kwargs)]
+                    for lib in (pr, pp)]
+    assert mine == theirs, (text, kwargs)
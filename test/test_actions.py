@@ -0,0 +1,44 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" parse actions: chaining across results names, replacing earlier ones, and pyparsing's signatures """
+from __future__ import division
+
+import pytest
+from pyparsing_regex import *
+
+nums = "0123456789"
+
+
+def double(value):
+    return value * 2
+
+
+def test_chained_across_name():
+    grammar = Word(nums).setParseAction(int)("n").addParseAction(double)
+    expected = Word(nums).setParseAction(lambda s: int(s) * 2)("n").parseString("21")
+    assert str(grammar.parseString("21")) == str(expected)
+    assert str(grammar.parseString("21")["n"]) == str(expected["n"])
+
+
+def test_set_replaces_beneath_name():
+    expected = str(Word(nums).setParseAction(double)("n").parseString("21")) # int is replaced, double gets the string
+    assert expected != str(Word(nums).setParseAction(int)("n").parseString("21"))
+    grammar = Word(nums).setParseAction(int)("n").setParseAction(double)
+    assert str(grammar.parseString("21")) == expected
+    grammar = Word(nums).setParseAction(int).setName("number")("n").setParseAction(double)
+    assert str(grammar.parseString("21")) == expected
+
+
+def test_composed():
+    grammar = Group(Word(nums).setParseAction(int)("n") + Literal(",")).setParseAction(lambda tokens: list(tokens)[0])
+    assert str(grammar.parseString("21,")) == str(Word(nums).setParseAction(int)("n").parseString("21"))
+
+
+def test_pyparsing_signatures():
+    """ told by the number of arguments, whatever their names, already when setting the action """
+    for action in (lambda s, loc, toks: toks, lambda loc, toks: toks, lambda a, b, c: c, lambda x, y: y, lambda: 1):
+        with pytest.raises(TypeError):
+            Word(nums).setParseAction(action)
+        with pytest.raises(TypeError):
+            Word(nums).addParseAction(int, action)
+    assert str(Word(nums).setParseAction(lambda s, base=10: int(s, base)).parseString("21")) == "[21]"
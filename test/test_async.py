@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" scanAsync on an in-process asyncio stream, fed chunk by chunk while the results are consumed
+
+results have to be the same as by scanString, wherever the chunk boundaries are
+"""
+from __future__ import division
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from pyparsing_regex import *
+from conftest import scanned
+
+w = Word("abc", exact=2)
+ww = GroupLiftKeys(w("a") + w("b"))("ww")
+data = "abcbbcccabccbcca--" * 50
+
+
+def scan(grammar, text, chunk_size, **kwargs):
+    loop = asyncio.new_event_loop()
+    try:
+        reader = asyncio.StreamReader(loop=loop)
+        for i in range(0, len(text), chunk_size): # data arrives step by step
+            loop.call_later(i / 100000, reader.feed_data, text[i:i + chunk_size])
+        loop.call_later(len(text) / 100000, reader.feed_eof)
+
+        scanner = grammar.scanAsync(reader, chunk_size=chunk_size, loop=loop, **kwargs)
+        results = []
+        while True:
+            result = loop.run_until_complete(scanner.get())
+            if result is None:
+                break
+            tokens, start, end = result
+            results.append((str(tokens), start, end))
+        return results
+    finally:
+        loop.close()
+
+
+class ChunkedReader(object):
+    """ stream whose coroutine ``read`` gives exactly the given chunks, i.e. with fixed chunk boundaries """
+    def __init__(self, chunks, loop):
+        self.chunks = list(chunks)
+        self.loop = loop
+
+    def read(self, n):
+        future = asyncio.Future(loop=self.loop)
+        self.loop.call_soon(future.set_result, self.chunks.pop(0) if self.chunks else '')
+        return future
+
+
+def scan_chunks(grammar, text, chunk_size):
+    loop = asyncio.new_event_loop()
+    try:
+        reader = ChunkedReader([text[i:i + chunk_size] for i in range(0, len(text), chunk_size)], loop)
+        scanner = grammar.scanAsync(reader, chunk_size=chunk_size, loop=loop)
+        results = []
+        result = loop.run_until_complete(scanner.get())
+        while result is not None:
+            tokens, start, end = result
+            results.append((str(tokens), start, end))
+            result = loop.run_until_complete(scanner.get())
+        return results
+    finally:
+        loop.close()
+
+
+def test_chunks():
+    for chunk_size in (1, 7, 64, 4096):
+        assert scan(ww, data, chunk_size) == scanned(ww.scanString(data)), chunk_size
+
+
+def test_optional_and_repeated_tails():
+    alphas = "abcdefghijklmnopqrstuvwxyz"
+    for grammar, text in [(OneOrMore(Word(alphas)), "ab cd ef;gh ij"),
+                          (Word("a") + Optional(Literal("bc")), "aabc aab aabc")]:
+        for chunk_size in (1, 3, len(text)):
+            assert scan_chunks(grammar, text, chunk_size) == scanned(grammar.scanString(text)), (text, chunk_size)
+
+
+def test_offload():
+    with ThreadPoolExecutor(2) as executor:
+        assert scan(ww, data, 7, offload=0, executor=executor) == scanned(ww.scanString(data))
+
+
+def test_maxMatches():
+    assert scan(ww, data, 7, maxMatches=3) == scanned(ww.scanString(data))[:3]
@@ -0,0 +1,59 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" parity of the result shaping backends: compiled _core_cython and the pure Python fallback within _core
+
+every grammar is parsed, scanned and lazily accessed with both, the Structures have to be identical
+"""
+from __future__ import division
+
+import os
+import subprocess
+import sys
+import pytest
+import pyparsing_regex._core as core
+from pyparsing_regex import *
+import conftest
+
+
+def results():
+    out = []
+    for grammar, text in conftest.grammars():
+        out.extend(conftest.results(grammar, text, 3))
+        out.append(str([tokens for tokens, start, end in grammar.scanString("--" + text, lazy="compact")]))
+        lazy = grammar.parseString(text, lazy=True)
+        out.append(str([lazy[key] for key in sorted(lazy.keys())]))
+    return out
+
+
+def compiled_backend():
+    try:
+        import pyparsing_regex._core_cython as compiled
+    except ImportError:
+        pytest.skip("_core_cython is not built, only the pure Python backend is available")
+    compiled.setup(core.ParseAction, core.ParserElement.EMPTY)
+    return compiled
+
+
+def test_same_results(monkeypatch):
+    monkeypatch.setattr(core, "_shaping", core)
+    expected = results()
+    monkeypatch.setattr(core, "_shaping", compiled_backend())
+    assert results() == expected
+
+
+def selected_backend(backend):
+    """ last output line of a fresh interpreter with ``PYPARSING_REGEX_BACKEND``: the repr of the name of the
+    shaping module together with a parse result, whatever else may have been printed before """
+    env = dict(os.environ, PYPARSING_REGEX_BACKEND=backend)
+    code = ("import pyparsing_regex._core as core; from pyparsing_regex import Literal, Word; "
+            "result = (Literal('<') + Word('ab')('w')).parseString('< ab'); "
+            "print(repr((core._shaping.__name__, str(result))))")
+    return subprocess.check_output([sys.executable, "-c", code], env=env).splitlines()[-1]
+
+
+def test_opt_in():
+    expected = str((Literal("<") + Word("ab")("w")).parseString("< ab"))
+    assert selected_backend("") == repr(("pyparsing_regex._core", expected))
+    compiled_backend()
+    # only the shaping is compiled, the ParserElements (e.g. Literal's base class) stay the same
+    assert selected_backend("cython") == repr(("pyparsing_regex._core_cython", expected))
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" BacktrackingWarning for risky patterns only, and timeouts turning catastrophic backtracking into errors """
+from __future__ import division
+
+import os
+import warnings
+import pytest
+import pyparsing_regex._core as core
+from pyparsing_regex import *
+
+catastrophic = "a" * 40 + "!b" # contains the required "b", which the scan prefilter would look for otherwise
+
+
+def timeouts_supported():
+    try:
+        core._check_timeouts()
+        return True
+    except NotImplementedError: # regex release without timeouts
+        return False
+
+needs_timeout = pytest.mark.skipif(not timeouts_supported(), reason="installed regex has no timeout")
+
+
+def risky():
+    return Regex("(?:a|aa)+b")
+
+
+def compile_warnings(grammar):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        grammar.parseString("ab")
+    return [warning for warning in caught if issubclass(warning.category, BacktrackingWarning)]
+
+
+def test_no_warning_for_words():
+    assert not compile_warnings(OneOrMore(Word("abc")))
+    assert not compile_warnings(ZeroOrMore(Word("abc", "def")) + Literal(";"))
+    assert not compile_warnings(OneOrMore(Group(Word("abc") + Optional(Word("0123456789")))))
+
+
+def test_warning_points_at_caller():
+    caught = compile_warnings(risky())
+    assert len(caught) == 1
+    assert os.path.splitext(caught[0].filename)[0] == os.path.splitext(__file__)[0]
+
+
+@needs_timeout
+def test_parseString_timeout():
+    with pytest.raises(ParseTimeoutError):
+        risky().parseString(catastrophic, timeout=0.05)
+    assert risky().parseString("aab", timeout=1) is not None
+
+
+@needs_timeout
+def test_scan_timeout():
+    with pytest.raises(ParseTimeoutError):
+        risky().searchString(catastrophic, timeout=0.05)
+    with pytest.raises(ParseTimeoutError):
+        list(risky().scanString(catastrophic, timeout=0.05))
+
+
+def test_other_runtime_errors_are_no_timeouts():
+    if core._RegexTimeout is RuntimeError: # Python 2
+        assert not core._timed_out(RuntimeError("maximum recursion depth exceeded"))
+        assert core._timed_out(RuntimeError("regex timed out"))
+
+
+def test_timeout_unsupported(monkeypatch):
+    """ a clear error instead of regex's TypeError for the unknown keyword """
+    monkeypatch.setattr(core, "_timeouts_supported", False)
+    with pytest.raises(NotImplementedError):
+        risky().parseString("aab", timeout=1)
+    with pytest.raises(NotImplementedError):
+        risky().searchString("aab", timeout=1)
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" cachedGrammar loads a still valid grammar instead of building it, and only trusted files """
+from __future__ import division
+
+import cPickle
+import os
+import shutil
+import tempfile
+import warnings
+import pyparsing_regex._cache as cache
+from pyparsing_regex import *
+
+built = []
+text = "abcb bcca"
+
+
+def builder():
+    built.append(True)
+    w = Word("abc", exact=2)
+    return OneOrMore(GroupLiftKeys(w("a") + w("b"))("ww"))
+
+
+def cached(directory):
+    return cachedGrammar(builder, os.path.join(directory, "grammar"))
+
+
+def test_cache():
+    directory = tempfile.mkdtemp()
+    try:
+        del built[:]
+        first = cached(directory)
+        second = cached(directory)
+        assert len(built) == 1
+        assert str(second.searchString(text)) == str(first.searchString(text)) == str(builder().searchString(text))
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_untrusted_file():
+    directory = tempfile.mkdtemp()
+    try:
+        del built[:]
+        cached(directory)
+        os.chmod(os.path.join(directory, "grammar"), 0o666) # others could have written it
+        cached(directory)
+        assert len(built) == 2
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_library_change():
+    directory = tempfile.mkdtemp()
+    library_hash = cache._library()
+    try:
+        del built[:]
+        cached(directory)
+        cache._library_hash = "changed"
+        cached(directory)
+        assert len(built) == 2
+    finally:
+        cache._library_hash = library_hash
+        shutil.rmtree(directory)
+
+
+def used_builder():
+    """ a grammar which was already used before being cached """
+    grammar = builder()
+    grammar.pattern, repr(grammar), grammar.parseString(text, parseAll=True)
+    return grammar
+
+
+def test_used_grammar():
+    """ like pickling, only the grammar tree and the compiled plan are stored, nothing rebuild on demand """
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "grammar")
+        first = cachedGrammar(used_builder, filename)
+        with open(filename, "rb") as f:
+            cPickle.load(f) # header
+            cls, state = cPickle.load(f)
+        assert state['_built'] is None and state['_parseAll'] is None
+        second = cachedGrammar(used_builder, filename)
+        assert str(second.searchString(text)) == str(first.searchString(text))
+    finally:
+        shutil.rmtree(directory)
+
+
+def unpicklable_builder():
+    return Word("0123456789")("n").setParseAction(lambda n: int(n) + 1)
+
+
+def test_unpicklable():
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "grammar")
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            grammar = cachedGrammar(unpicklable_builder, filename)
+        assert [warning.category for warning in caught] == [RuntimeWarning]
+        assert str(grammar.parseString("41")) == str(unpicklable_builder().parseString("41"))
+        assert not os.listdir(directory)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" searchColumns has to give the same values as searchString, column by column """
+from __future__ import division
+
+import pytest
+from pyparsing_regex import *
+
+nums = "0123456789"
+
+
+def grammar():
+    """ named leaves with and without parse actions, optional and within a repetition """
+    return (Word("abc")("w") + Optional(Word(nums)("n").setParseAction(int))
+            + ZeroOrMore(Literal(",") + Word(nums)("more").setParseAction(int)) + Optional(Word("xyz")("x")))
+
+
+text = "ab 1 ,2,3 ; c x; bb 7 ,4 zz;"
+
+
+def values(result, name):
+    """ the leaves of ``name`` within ``result`` """
+    return [leaf for sub in result[name] for leaf in sub]
+
+
+def test_same_values():
+    starts, ends, columns = grammar().searchColumns(text)
+    scanned = list(grammar().scanString(text))
+    assert list(starts) == [start for tokens, start, end in scanned]
+    assert list(ends) == [end for tokens, start, end in scanned]
+    assert sorted(columns) == ["more", "n", "w", "x"]
+    for name in ("w", "n", "x"):
+        assert columns[name] == [values(result, name)[0] for result in grammar().searchString(text)], name
+    assert columns["n"] == [1, None, 7]
+    assert columns["more"] == [[2, 3], [], [4]]
+
+
+def test_actions_per_column():
+    """ parse actions belong to their own column only, wherever the leaf is """
+    calls = []
+    def to_int(s):
+        calls.append(s)
+        return int(s)
+    element = Word("abc")("w") + Word(nums)("n").setParseAction(to_int) + Word("xyz")("x")
+    starts, ends, columns = element.searchColumns("a 1 x; b 22 yy")
+    assert columns == dict(w=["a", "b"], n=[1, 22], x=["x", "yy"])
+    assert calls == ["1", "22"]
+
+
+def test_names():
+    starts, ends, columns = grammar().searchColumns(text, names=["x", "n"], maxMatches=2)
+    assert columns == dict(x=[None, "x"], n=[1, None])
+    assert list(starts) == [start for tokens, start, end in grammar().scanString(text, maxMatches=2)]
+    with pytest.raises(KeyError):
+        Group(Word("abc")("w") + Word(nums))("g").searchColumns(text, names=["g"])
+
+
+def test_asNumpy():
+    numpy = pytest.importorskip("numpy")
+    starts, ends, columns = grammar().searchColumns(text, asNumpy=True)
+    plain_starts, plain_ends, plain_columns = grammar().searchColumns(text)
+    assert starts.tolist() == list(plain_starts) and ends.tolist() == list(plain_ends)
+    for name, column in columns.items():
+        assert column.dtype == numpy.dtype(object)
+        assert column.tolist() == plain_columns[name], name
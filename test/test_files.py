@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" parseFile / scanFile / searchFile over memory mapped files have to give the same results as on strings """
+from __future__ import division
+
+import os
+import tempfile
+from pyparsing_regex import *
+from conftest import scanned
+
+grammar = Word(b"abc")("w") + Optional(Literal(b"=") + Word(b"0123456789")("n"))
+text = b"ab=12 cc ;; abc=3 b\n" * 20
+
+
+def written(content):
+    fd, filename = tempfile.mkstemp()
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return filename
+
+
+def test_file_like_string():
+    filename = written(text)
+    try:
+        assert str(grammar.parseFile(filename)) == str(grammar.parseString(text))
+        assert scanned(grammar.scanFile(filename)) == scanned(grammar.scanString(text))
+        assert str(grammar.searchFile(filename, maxMatches=3)) == str(grammar.searchString(text, maxMatches=3))
+        with open(filename, "rb") as f: # also file objects
+            assert str(grammar.searchFile(f)) == str(grammar.searchString(text))
+    finally:
+        os.remove(filename)
+
+
+def test_lazy_captures():
+    filename = written(text)
+    try:
+        tokens = grammar.parseFile(filename)
+        expected = grammar.parseString(text)
+        assert str(tokens["w"]) == str(expected["w"]) and str(tokens["n"]) == str(expected["n"])
+        assert str(tokens[0][0]) == "ab"
+    finally:
+        os.remove(filename)
+
+
+def test_empty_file():
+    filename = written(b"")
+    try:
+        assert grammar.searchFile(filename) == []
+        assert grammar.parseFile(filename) is None
+    finally:
+        os.remove(filename)
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" lazy and compact results have to give the same values as the eagerly shaped Structure, however they are accessed """
+from __future__ import division
+
+from pyparsing_regex import *
+import conftest
+
+
+def grammars():
+    """ the shared grammars and ones with names used several times, nested, optional or within repetitions,
+    together with their input """
+    for grammar in conftest.grammars():
+        yield grammar
+    w = Word("abc", exact=2)
+    yield GroupLiftKeys(Word("a")("z") + Word("b"))("z"), "aa b"
+    yield Optional(Word("a")("z"))("z"), "aa"
+    yield Optional(Word("a")("z"))("z") + Word("b")("z"), "b"
+    yield Repeat(GroupLiftKeys(w("a") + w("b"))("ww"), 2, 4), "abcbbcccabccbcca"
+    yield Word("0123456789")("int").setParseAction(int) + Optional(Literal(".") + Word("0123456789")("frac")), "3.1415"
+    yield Group(Word("xyz")("w") + Optional(Literal("!")("bang")))("g") + Word("xyz")("w"), "xx! yy"
+    # names on repetitions
+    yield OneOrMore(Word("ac"))("x"), "ac ca"
+    yield Word("b") + OneOrMore(Word("ac"))("x"), "b ac ca"
+    yield Word("b") + ZeroOrMore(Word("ac"))("x"), "b"
+    yield Repeat(GroupLiftKeys(w("a") + Optional(w("b")))("ww"), 1, 3)("r") + Word("b")("x"), "abcb ca b"
+    yield ZeroOrMore(Optional(Word("ab"))("z"))("x"), "b ac ca"
+
+
+def test_keys():
+    for grammar, text in grammars():
+        eager = grammar.parseString(text)
+        for lazy in (grammar.parseString(text, lazy=True), grammar.parseString(text, lazy="compact")):
+            assert sorted(lazy.keys()) == sorted(eager.keys()), text
+            for key in eager.keys():
+                assert str(lazy[key]) == str(eager[key]), (text, key)
+
+
+def test_indices():
+    for grammar, text in grammars():
+        eager = list(grammar.parseString(text))
+        for lazy in (grammar.parseString(text, lazy=True), grammar.parseString(text, lazy="compact")):
+            for index in range(len(eager)):
+                assert str(lazy[index]) == str(eager[index]), (text, index)
+                assert str(lazy[long(index)]) == str(eager[index]), (text, index)
+            assert [str(value) for value in lazy] == [str(value) for value in eager], text
+
+
+def test_slices():
+    for grammar, text in grammars():
+        eager = grammar.parseString(text)
+        for lazy in (grammar.parseString(text, lazy=True), grammar.parseString(text, lazy="compact")):
+            for index in (slice(0, 1), slice(1, None), slice(None, None, -1)):
+                assert str(lazy[index]) == str(eager[index]), (text, index)
+
+
+def test_build():
+    for grammar, text in grammars():
+        for lazy in (grammar.parseString(text, lazy=True), grammar.parseString(text, lazy="compact")):
+            for key in lazy.keys(): # key access before building must not change the complete result
+                lazy[key]
+            assert str(lazy) == str(grammar.parseString(text)), text
+
+
+def test_compact_scan():
+    """ all results of a scan share one offset table """
+    for grammar, text in grammars():
+        text = ("--" + text) * 3
+        eager = list(grammar.scanString(text))
+        compact = list(grammar.scanString(text, lazy="compact"))
+        assert [(start, end) for tokens, start, end in compact] == [(start, end) for tokens, start, end in eager]
+        for (tokens, start, end), (expected, _, _) in reversed(zip(compact, eager)): # any order of access
+            for key in expected.keys():
+                assert str(tokens[key]) == str(expected[key]), (text, key)
+            assert str(tokens) == str(expected), text
+            assert tokens.parse_end == end
+
+
+def test_compact_repeated_names():
+    """ names on repetitions, within a scan sharing one table """
+    grammar = Word("b") + OneOrMore(Word("ac"))("x") + ZeroOrMore(Word("d"))("y")
+    text = "b ac ca d; b ac; b ca ca ca d d"
+    for (tokens, _, _), (expected, _, _) in zip(grammar.scanString(text, lazy="compact"), grammar.scanString(text)):
+        assert str(tokens["x"]) == str(expected["x"]) and str(tokens["y"]) == str(expected["y"])
+        assert str(tokens[1]) == str(expected[1])
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" minimized patterns have to give the same results as the patterns as built """
+from __future__ import division
+
+import regex
+import pyparsing_regex._helpers_regex as hre
+from pyparsing_regex import *
+import conftest
+
+
+def grammars():
+    """ the shared grammars and ones with redundant groups, single char alternatives and repetitions,
+    together with their input """
+    for grammar in conftest.grammars():
+        yield grammar
+    yield Group(Word("a") + Group(Word("b")))("g") + Optional(Literal("!")), "aa bb !"
+    yield OneOrMore(Literal("x") | Literal("y") | Literal("z")), "xyzzy"
+    yield Regex("a(?:b)*c") + Word("0123456789")("n"), "abbc 42"
+    yield Suppress(Literal("<")) + SkipTo(Literal(">"))("inner") + Suppress(Literal(">")), "<some skipped text>"
+
+
+def unminimized(monkeypatch, grammar):
+    unchanged = dict(captures=0, groups=0, quantifiers=0, merged=0)
+    monkeypatch.setattr(hre, "minimize_tree", lambda pattern, leaves=None: (pattern, unchanged, None))
+    grammar.compile()
+    monkeypatch.undo()
+
+
+def test_same_results(monkeypatch):
+    for (grammar, text), (plain, _) in zip(grammars(), grammars()):
+        unminimized(monkeypatch, plain)
+        assert conftest.results(grammar, text) == conftest.results(plain, text), text
+
+
+def test_same_matches():
+    """ also the user's groups are silenced, the minimized pattern has to match the same text """
+    for grammar, text in list(grammars()) + [(Regex("(a)(b|c)*c") + Word("0123456789")("n"), "abbc 42")]:
+        grammar.compile()
+        minimized = grammar._compiled.match(text)
+        built = regex.match(grammar.compiledPattern, text)
+        assert minimized.span() == built.span(), text
+
+
+def test_stats():
+    grammar = Regex("(a)(?:b)*c") + Word("0123456789")("n")
+    grammar.compile()
+    assert grammar.minimizeStats["captures"] == 1 # the user's group within the leaf
+    assert str(grammar.parseString("abbc 42")) == "[abbc,[42]]"
+    assert sum(grammar.minimizeStats.values()) >= 2
+
+
+def test_parsed_once(monkeypatch):
+    """ minimizing, prefiltering and the backtracking check share one parse of the pattern """
+    parses = []
+    parse = hre._PatternParser.parse
+    monkeypatch.setattr(hre._PatternParser, "parse", lambda self: parses.append(self) or parse(self))
+    for grammar, text in grammars():
+        del parses[:]
+        grammar.compile()
+        assert len(parses) == 1, text
+
+
+def test_parseAll_after_change():
+    """ the element used for ``parseAll`` is kept, but has to follow changes of the grammar """
+    grammar = Word("a")
+    assert str(grammar.parseString("aa", parseAll=True)) == str((grammar + StringEnd()).parseString("aa"))
+    grammar += Word("b")
+    assert str(grammar.parseString("aa bb", parseAll=True)) == str((grammar + StringEnd()).parseString("aa bb"))
@@ -0,0 +1,24 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" oneOf has to match like pyparsing's oneOf """
+from __future__ import division
+
+import pyparsing as pp
+from pyparsing_regex import *
+
+text = "select x from y WHERE z = 1 and fromage <= 2"
+
+
+def tokens(results):
+    return [[str(token) for token in result] for result in results]
+
+
+def test_longest():
+    keywords = "< <= = from fromage"
+    assert tokens(oneOf(keywords).searchString(text)) == tokens(pp.oneOf(keywords).searchString(text))
+
+
+def test_caseless_returns_declared():
+    keywords = "Select FROM where"
+    expected = tokens(pp.oneOf(keywords, caseless=True).searchString(text))
+    assert tokens(oneOf(keywords, caseless=True).searchString(text)) == expected
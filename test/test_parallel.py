@@ -0,0 +1,27 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" parseMany / searchMany distributed over worker processes have to give the results of parseString / searchString """
+from __future__ import division
+
+from pyparsing_regex import *
+
+w = Word("abc", exact=2)
+grammar = Repeat(GroupLiftKeys(w("a") + w("b"))("ww"), 1, 3) + Optional(Literal("!")("bang"))
+records = ["abcb", "abcbbc!", "cc", "abcbbcccab!", "--", "ab ca cb"] * 20
+
+
+def test_parseMany():
+    expected = [str(grammar.parseString(record)) for record in records]
+    assert [str(result) for result in grammar.parseMany(records, workers=2, chunksize=7)] == expected
+    unordered = dict(grammar.parseMany(records, workers=2, chunksize=7, ordered=False))
+    assert [str(unordered[index]) for index in range(len(records))] == expected
+
+
+def test_parseMany_parseAll():
+    expected = [str(grammar.parseString(record, parseAll=True)) for record in records]
+    assert [str(result) for result in grammar.parseMany(records, workers=2, parseAll=True)] == expected
+
+
+def test_searchMany():
+    expected = [str(grammar.searchString(record)) for record in records]
+    assert [str(result) for result in grammar.searchMany(records, workers=2, chunksize=5)] == expected
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" the process-wide cache of compiled patterns: LRU order, statistics and concurrent use """
+from __future__ import division
+
+import threading
+import time
+import regex
+import pyparsing_regex._helpers_regex as hre
+
+
+def test_lru_order():
+    cache = hre.PatternCache(maxsize=2)
+    a = cache.get("a")
+    cache.get("b")
+    assert cache.get("a") is a # "a" becomes the most recently used, "b" is evicted next
+    cache.get("c")
+    assert cache.get("a") is a
+    assert cache.info()["evictions"] == 1
+    cache.get("b")
+    assert cache.info()["evictions"] == 2 # "c" was the least recently used
+    assert cache.get("b").pattern == "b" and cache.get("a") is a
+
+
+def test_statistics():
+    cache = hre.PatternCache(maxsize=2)
+    cache.get("a")
+    cache.get("a")
+    cache.get("a", regex.I) # flags are part of the key
+    cache.get("b")
+    assert cache.info() == dict(hits=1, misses=3, evictions=1, size=2, maxsize=2)
+    cache.clear()
+    assert cache.info() == dict(hits=0, misses=0, evictions=0, size=0, maxsize=2)
+
+
+def test_concurrent_compile(monkeypatch):
+    """ threads compiling the same pattern at once all get the first compiled object """
+    cache = hre.PatternCache()
+    compile = regex.compile
+    def slow_compile(pattern, flags=0):
+        time.sleep(0.01) # all threads compile before any of them caches
+        regex.purge() # a new object each time, not the one of regex's own cache
+        return compile(pattern, flags)
+    monkeypatch.setattr(hre.regex, "compile", slow_compile)
+
+    start = threading.Event()
+    compiled = []
+    def work():
+        start.wait()
+        compiled.append(cache.get("(a|b)+c"))
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(compiled) == 8
+    assert all(c is compiled[0] for c in compiled)
+    assert cache.info()["size"] == 1
+    assert cache.get("(a|b)+c") is compiled[0]
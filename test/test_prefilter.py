@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" prefiltered scans have to find the same matches as searching with the compiled pattern at every position,
+and like pyparsing's scanString, also with ``overlap`` and ``maxMatches`` """
+from __future__ import division
+
+import pyparsing_regex._helpers_regex as hre
+from pyparsing_regex import *
+import conftest
+
+texts = ["", "no match here", "   \n\n   " * 50 + "<ab>", "x <ab> y <cd>\n<  ef>  <>", "ab>" * 30 + "<ab" * 30]
+
+
+def grammars():
+    yield Literal("<") + Word("abcdef") + Literal(">")
+    yield Suppress(Literal("<")) + SkipTo(Literal(">"))("inner") + Suppress(Literal(">"))
+    yield Word("abcdef")("w") + Optional(Literal(">"))
+    yield Literal("<") | Literal(">")
+    yield Optional(Literal("x")) + Literal("<") # may start with whitespace after the skip
+
+
+def spans(grammar, text):
+    return [match.span() for match in grammar._getCompiled().finditer(text)]
+
+
+def test_like_unfiltered():
+    for grammar in grammars():
+        for text in texts:
+            assert [(start, end) for tokens, start, end in grammar.scanString(text)] == spans(grammar, text), text
+
+
+def test_prefilter():
+    grammar = Literal("<") + Word("abcdef") + Literal(">")
+    search, required = hre.scan_prefilter(grammar.compiledPattern)
+    assert search is not None and search.startswith("(<)") # without the leading whitespace skip
+    assert required == "<"
+    assert grammar.searchString("   " * 1000 + "ab>") == [] # required literal missing
+    assert hre.scan_prefilter(Optional(Literal(" x")).compiledPattern)[0] is None # may match empty
+
+
+def test_like_pyparsing():
+    builds = [lambda lib: lib.Word("ab", exact=2),
+              lambda lib: lib.Word("ab") + lib.Literal(";"),
+              lambda lib: lib.Literal("<") + lib.Word("abc") + lib.Literal(">"),
+              lambda lib: lib.Word("abc") + lib.Optional(lib.Word("0123456789"))]
+    texts = ["", "abab;aab ;", "aaaa b ab", "<ab> <<abc>> <a", "ab 12 c3 ;bb  4"]
+    options = [dict(overlap=True), dict(maxMatches=0), dict(maxMatches=1), dict(maxMatches=2, overlap=True)]
+    for build in builds:
+        for text in texts:
+            for kwargs in options:
+                conftest.assert_scan_like_pyparsing(build, text, **kwargs)
+
+
+def test_overlap_after_whitespace():
+    """ pyparsing continues after the end of an overlapping match preceded by whitespace, here every start counts """
+    scanned = [(start, end) for tokens, start, end in Word("ab").scanString("  ab  ba", overlap=True)]
+    assert scanned == [(2, 4), (3, 4), (6, 8), (7, 8)]
@@ -0,0 +1,49 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" profiling records calls and time per element name and phase """
+from __future__ import division
+
+from pyparsing_regex import *
+
+
+def grammar():
+    return (Word("abc")("w") + Optional(Word("0123456789")("n"))).setName("pair")
+
+
+def test_phases():
+    element = grammar()
+    with profiling():
+        element.parseString("ab 1")
+        element.parseString("c")
+        list(element.scanString("ab 1 ; c; b 2"))
+    stats = profileStats()
+    assert sorted(stats) == ["pair"]
+    phases = stats["pair"]
+    assert sorted(phases) == ["compile", "match", "minimize", "plan", "shape"]
+    for phase in ("plan", "minimize", "compile"): # compiled only once
+        assert phases[phase]["calls"] == 1, phase
+    assert phases["shape"]["calls"] == 5
+    assert phases["match"]["calls"] == 2 + 3 # two parses, three matches of the scan
+    assert all(phase["time"] >= 0 for phase in phases.values())
+
+
+def test_disabled():
+    element = grammar()
+    with profiling():
+        element.parseString("ab 1")
+    element.parseString("ab 1") # not recorded outside of the block
+    assert profileStats()["pair"]["shape"]["calls"] == 1
+
+    with profiling(reset_stats=False):
+        element.parseString("ab 1")
+    assert profileStats()["pair"]["shape"]["calls"] == 2
+    resetProfileStats()
+    assert profileStats() == {}
+
+    enableProfiling()
+    try:
+        grammar().parseString("ab 1")
+    finally:
+        disableProfiling()
+    assert profileStats()["pair"]["minimize"]["calls"] == 1
+    resetProfileStats()
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" matchSpans / scanSpans have to locate the same matches as scanString, spanIndex the same captures """
+from __future__ import division
+
+from pyparsing_regex import *
+
+nums = "0123456789"
+
+
+def grammars():
+    """ grammars with optional and repeated named leaves, together with their input """
+    yield Word("abc")("w") + Optional(Word(nums)("n")), "ab 1 c;  bb 22 x"
+    yield Word("a") + ZeroOrMore(Literal(",") + Word(nums)("more")), "a,1,2 aa ;a,3"
+    yield Word("aa", exact=2)("pair"), "aaaaa b aaa"
+
+
+def test_scan():
+    for grammar, text in grammars():
+        for overlap in (False, True):
+            expected = [(start, end) for tokens, start, end in grammar.scanString(text, overlap=overlap)]
+            assert [(start, end) for start, end, spans in grammar.scanSpans(text, overlap=overlap)] == expected, \
+                (text, overlap)
+        assert len(list(grammar.scanSpans(text, maxMatches=1))) == 1
+        assert list(grammar.scanSpans("")) == []
+
+
+def test_overlap():
+    grammar = Word("aa", exact=2)
+    assert [(start, end) for start, end, spans in grammar.scanSpans("aaaa", overlap=True)] == [(0, 2), (1, 3), (2, 4)]
+
+
+def test_match():
+    for grammar, text in grammars():
+        tokens, start, end = next(grammar.scanString(text))
+        assert grammar.matchSpans(text)[:2] == (start, end), text
+        assert grammar.matchSpans("--" + text) is None
+        assert grammar.matchSpans("") is None
+
+
+def test_spanIndex():
+    """ the slots named by spanIndex hold the captures also given by searchColumns """
+    for grammar, text in grammars():
+        index = grammar.spanIndex()
+        starts, ends, columns = grammar.searchColumns(text)
+        assert sorted(index) == sorted(columns)
+        for i, (start, end, spans) in enumerate(grammar.scanSpans(text)):
+            assert (start, end) == (starts[i], ends[i])
+            for name, slot in index.items():
+                value = columns[name][i]
+                if not isinstance(value, list): # single leaf, None if not matched
+                    value = [] if value is None else [value]
+                assert [text[s:e] for s, e in spans[slot]] == value, (text, name)
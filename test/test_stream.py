@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" scanStream has to give the same results as scanString, wherever the chunk boundaries are """
+from __future__ import division
+
+import pytest
+from StringIO import StringIO
+from pyparsing_regex import *
+from pyparsing_regex._core import StreamScanner
+from conftest import scanned
+
+alphas = "abcdefghijklmnopqrstuvwxyz"
+
+
+def grammars():
+    """ grammars with optional and repeated tails, which may continue beyond any chunk """
+    yield OneOrMore(Word(alphas)), "ab cd ef;gh ij"
+    yield Word("a") + Optional(Literal("bc")), "aabc aab aabc"
+    yield ZeroOrMore(Literal("bc")) + Word("c"), "cccbacacc;ac b;a aaa;acbca;bcc"
+    yield Optional(Word("c")) | Literal("bc"), "acba;b bcc ;; bbbb;bbac;;bcb ;"
+    yield Group(Word("0123456789")("n") + Optional(Literal(".") + Word("0123456789")("frac"))), "1 2.5 3. 44.44"
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_chunk_boundaries():
+    for grammar, text in grammars():
+        expected = scanned(grammar.scanString(text))
+        for size in (1, 3, len(text)):
+            assert scanned(grammar.scanStream(chunks(text, size))) == expected, (text, size)
+
+
+def test_file_source():
+    grammar, text = next(grammars())
+    assert scanned(grammar.scanStream(StringIO(text), chunk_size=3)) == scanned(grammar.scanString(text))
+
+
+def test_maxMatches():
+    grammar, text = next(grammars())
+    assert scanned(grammar.scanStream(chunks(text, 1), maxMatches=1)) == scanned(grammar.scanString(text))[:1]
+
+
+def test_maxCarry():
+    """ a pending match longer than ``maxCarry`` raises, after all matches completed before it """
+    grammar = Word("a") + Literal(";")
+    text = "a; aa; aaaaaaaaaa; a;"
+    expected = scanned(grammar.scanString(text))
+    assert scanned(grammar.scanStream(chunks(text, 1))) == expected
+    for size in (1, 2, 5):
+        carried = []
+        with pytest.raises(CarryExceededError):
+            for result in grammar.scanStream(chunks(text, size), maxCarry=3):
+                carried.append(result)
+        carried = scanned(carried)
+        assert set(carried) <= set(expected), size # nothing starting within the abandoned match
+        assert carried == expected[:2], size
+
+    scanner = StreamScanner(grammar, maxCarry=3)
+    with pytest.raises(CarryExceededError):
+        for chunk in chunks(text, 2):
+            scanner.feed(chunk)
+            assert len(scanner.buffer) <= 3 + 2
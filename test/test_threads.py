@@ -0,0 +1,41 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" stress test: many threads compile and parse different grammars at the same time
+
+every result is compared with the one computed single threaded beforehand
+"""
+from __future__ import division
+
+import sys
+import threading
+import conftest
+
+
+def results(repeat=1):
+    """ of fresh grammars, i.e. compiled within the threads """
+    return [result for grammar, text in conftest.grammars() for result in conftest.results(grammar, text, repeat)]
+
+
+def test_threads():
+    expected = results(5)
+    errors = []
+
+    def work():
+        try:
+            for _ in range(25):
+                if results(5) != expected:
+                    errors.append("different results")
+        except Exception as e:
+            errors.append(repr(e))
+
+    interval = sys.getcheckinterval()
+    sys.setcheckinterval(1) # switch threads as often as possible
+    try:
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setcheckinterval(interval)
+    assert not errors, errors[:5]
@@ -0,0 +1,30 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" transformString has to replace like pyparsing's transformString """
+from __future__ import division
+
+import pyparsing as pp
+import pyparsing_regex as pr
+
+text = "x = 12; y=3 ;z  =  456;; w"
+
+
+def grammars(lib, upper):
+    """ the same grammar in pyparsing (``lib=pp``) and pyparsing_regex (``lib=pr``) """
+    name = lib.Word("xyz")
+    number = lib.Word("0123456789")
+    yield name + lib.Suppress(lib.Literal("=")) + number
+    yield name + lib.Literal("=") + lib.Optional(number) + lib.Suppress(lib.Literal(";"))
+    yield lib.OneOrMore(lib.Group(number + lib.Suppress(lib.Literal(";"))))
+    yield lib.Word("xyz").setParseAction(upper) + lib.Literal("=")
+
+
+def test_like_pyparsing():
+    for mine, theirs in zip(grammars(pr, str.upper), grammars(pp, lambda tokens: tokens[0].upper())):
+        assert mine.transformString(text) == theirs.transformString(text)
+
+
+def test_replacement():
+    grammar = pr.Word("xyz")("name") + pr.Literal("=") + pr.Word("0123456789")("value")
+    assert grammar.transformString(text, r"\g<value>:\g<name>") == "12:x; 3:y ;456:z;; w"
+    assert grammar.transformString(text, lambda tokens: "#") == "#; # ;#;; w"
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" whitespace skipping has to give the same tokens and locations as pyparsing """
+from __future__ import division
+
+import pyparsing as pp
+import pyparsing_regex as pr
+import conftest
+
+texts = ["  ab cd\n  ef  \n gh ;x", "ab 12  cd 3 ;ef  ;\n gh ;", "ab cd\nef  gh;\n\n ;x y", "ab\n\nc  d ;;"] # no tabs, pyparsing expands them
+letters = "abcdefgh"
+
+
+def assert_like_pyparsing(build):
+    """ ``build(lib)`` constructs the same grammar with pyparsing (``lib=pp``) and pyparsing_regex (``lib=pr``) """
+    for text in texts:
+        conftest.assert_scan_like_pyparsing(build, text)
+
+
+def test_and():
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.Word(letters) + lib.Literal(";"))
+
+
+def test_optional_repeat():
+    assert_like_pyparsing(lambda lib: lib.OneOrMore(lib.Word(letters)) + lib.Optional(lib.Literal(";")))
+
+
+def test_nested_first_token():
+    assert_like_pyparsing(lambda lib: lib.Group(lib.Word(letters) + lib.Word(letters)))
+    assert_like_pyparsing(lambda lib: lib.Optional(lib.Literal(";")) + lib.Word(letters))
+    assert_like_pyparsing(lambda lib: lib.Literal(";") | lib.Word(letters))
+
+
+def test_trailing_optional():
+    """ like in pyparsing, whitespace before a failing Optional or ZeroOrMore is part of the match """
+    nums = "0123456789"
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.Optional(lib.Word(nums)))
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.ZeroOrMore(lib.Word(nums)))
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.OneOrMore(lib.Word(nums)))
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.Optional(lib.Literal(";") + lib.Word(letters)))
+    for text in ["ab  z ab 1", "x ab 12 y ab z"]:
+        build = lambda lib: lib.Word("ab") + lib.Optional(lib.Word(nums))
+        assert [(start, end) for tokens, start, end in build(pr).scanString(text)] == \
+               [(start, end) for tokens, start, end in build(pp).scanString(text)]
+        assert build(pr).transformString(text) == build(pp).transformString(text)
+
+
+def test_whitespace_chars():
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.Word(letters).setWhitespaceChars(" "))
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.Literal(";").leaveWhitespace())
+
+
+def test_CharsNotIn():
+    assert_like_pyparsing(lambda lib: lib.CharsNotIn(";\n"))
+    assert_like_pyparsing(lambda lib: lib.Literal(";") + lib.CharsNotIn(";\n"))
+
+
+def test_LineStart():
+    assert_like_pyparsing(lambda lib: lib.LineStart() + lib.Word(letters))
+
+
+def test_StringStart():
+    assert_like_pyparsing(lambda lib: lib.StringStart() + lib.Word(letters))
+
+
+def test_FollowedBy():
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.FollowedBy(lib.Literal(";")))
+    assert_like_pyparsing(lambda lib: lib.Literal(";") + lib.FollowedBy(lib.Word(letters)))
+
+
+def test_LineEnd():
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.LineEnd())
+
+
+def test_Suppress():
+    """ the class form skips whitespace like expr.suppress(): before the start of the match, unless left """
+    assert_like_pyparsing(lambda lib: lib.Suppress(lib.Literal(";")) + lib.Word(letters))
+    assert_like_pyparsing(lambda lib: lib.Suppress(lib.Word(letters) + lib.Word(letters)) + lib.Literal(";"))
+    assert_like_pyparsing(lambda lib: lib.Word(letters) + lib.Suppress(lib.Literal(";")).leaveWhitespace())
+    for text, build in [("  <ab  <ba", lambda lib: lib.Suppress(lib.Literal("<")) + lib.Word("ab")),
+                        ("ab ; ab;", lambda lib: lib.Suppress(lib.Literal(";")).leaveWhitespace())]:
+        assert [(start, end) for tokens, start, end in build(pr).scanString(text)] == \
+               [(start, end) for tokens, start, end in build(pp).scanString(text)]
+        assert build(pr).transformString(text) == build(pp).transformString(text)
+
+
+def test_SkipTo():
+    """ like in pyparsing, only the leading skip of the target is left, its tokens may be separated by whitespace """
+    for text in ["xyz a b", "xyz c d", "x a  b\nc d a"]:
+        conftest.assert_scan_like_pyparsing(lambda lib: lib.SkipTo(lib.Literal("a") + lib.Literal("b")), text)
+        conftest.assert_scan_like_pyparsing(
+            lambda lib: lib.SkipTo(lib.Literal("a") + lib.Literal("b") | lib.Literal("c") + lib.Literal("d")), text)
+
+
+def test_container_whitespace_chars():
+    """ the first token of a container is not pre-parsed, also if its own whitespace chars differ """
+    for text in ["x\na b", "a\n b\na b"]:
+        conftest.assert_scan_like_pyparsing(lambda lib: (lib.Word("a") + lib.Word("b")).setWhitespaceChars(" "), text)